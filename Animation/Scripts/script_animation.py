@@ -7,19 +7,28 @@
 #-----------------------------------------------------------------------------------------------------------
 from netCDF4 import Dataset                                  # Read / Write NetCDF4 files
 import matplotlib.pyplot as plt                              # Plotting library
-import cartopy, cartopy.crs as ccrs                          # Plot maps
-import cartopy.io.shapereader as shpreader                   # Import shapefiles
+import cartopy.crs as ccrs                                   # Plot maps
 import numpy as np                                           # Scientific computing with Python
 from datetime import datetime, timedelta                     # Basic Dates and time types
 import os                                                    # Miscellaneous operating system interfaces
 import glob                                                  # Unix style pathname pattern expansion
-from shutil import copyfile                                  # Copy files
 from osgeo import osr                                        # Python bindings for GDAL
 from osgeo import gdal                                       # Python bindings for GDAL
-from matplotlib.colors import LinearSegmentedColormap        # Linear interpolation for color maps
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes # Add a child inset axes to this existing axes
-from utilities import loadCPT                                # Import the CPT convert function
+from utilities import loadCPT_cmap                           # Import the CPT convert function
 from utilities import download_CMI                           # Our function for download
+from utilities import compile_CPT, render_frame              # Our functions for the fast renderer
+from utilities import text_layer, load_layer, colorbar_layer # Our functions for the fast renderer
+from utilities import MAP_STYLE, add_map_elements, map_overlay # Our functions for the map elements
+from utilities import plot_frame, render_pool                # Our functions for the figure template
+from utilities import close_render_pool                      # Our function for the figure template
+from utilities import publish_frame, clear_animation         # Our functions for the HTML animation
+from utilities import animation_frames                       # Our function for the HTML animation
+from utilities import open_animation, append_frame, close_animation # Our functions for the animation file
+from utilities import LUT_palette                            # Our function for the GIF palette
+from utilities import warp_LUT, warp, scan_times             # Our functions for the service mode
+from utilities import wait_CMI                               # Our function for the service mode
+from utilities import received_scans                         # Our function for the FAZZT mode
 gdal.PushErrorHandler('CPLQuietErrorHandler')                # Ignore GDAL warnings
 #-----------------------------------------------------------------------------------------------------------
 
@@ -31,11 +40,6 @@ gdal.PushErrorHandler('CPLQuietErrorHandler')                # Ignore GDAL warni
 input = "..//Samples"; os.makedirs(input, exist_ok=True)
 output = "..//Output"; os.makedirs(output, exist_ok=True)
 
-# Delete all existent files in the 'Output' directory 
-files = glob.glob('..//Output//*')
-for f in files:
-    os.remove(f)
-    
 # AMAZON repository information 
 # https://noaa-goes16.s3.amazonaws.com/index.html
 bucket_name = 'noaa-goes16'
@@ -60,369 +64,449 @@ date_end = '202007291700'
 # Interval between images (minutes)
 interval = 60
 
+# Mode: 'batch' (process the dates between the start and end dates and exit), 'service' (keep running and 
+# process each new scan as soon as it is available, every 'interval' minutes, keeping the downloads client, 
+# color tables, reprojection tables, map overlays and figures in memory) or 'fazzt' (keep running and process 
+# each new scan received by GEONETCast-Americas in 'fazzt_dir', as soon as it arrives)
+mode = 'batch'
+
+# Directories of the files received by the FAZZT client (for the 'fazzt' mode)
+fazzt_dir = ['/data/fazzt']
+
+# Reprojection: 'gdal' (gdal.Warp) or 'lut' (nearest neighbour with a table of pixel indices, computed once)
+reprojection = 'gdal'
+
+# Renderer: 'matplotlib' (publication quality figures), 'template' (the same figure, built only once and 
+# reused for all the frames) or 'raster' (fast, colors the data with a lookup table and composites 
+# pre-rasterized layers, without matplotlib)
+renderer = 'matplotlib'
+
+# Number of processes for the 'template' renderer (1: render in this process). The frames are plotted by 
+# the workers while the next images are downloaded and reprojected
+workers = 1
+
+# Animation file also created with the frames, written frame by frame ('.gif', '.webp' or '.mp4', '' for none).
+# In the service mode, it is written again with the frames of the HTML animation after each new frame
+loop_file = ''
+
 #################
 # USER INPUT: END
 #################
 
+# Map elements: shapefile, coastlines, borders, gridlines and labels [lon, lat, label, label x offset, label y offset]
+map_style = dict(MAP_STYLE, shapefile='..//Shapefiles//ne_10m_admin_1_states_provinces.shp',
+                 points=[[-61.7927, 17.1402, "Antigua and Barbuda", 0.4, 0.1],
+                         [-59.4870, 13.0858, "Barbados", 0.4, 0.0],
+                         [-61.3916, 15.3388, "Dominica", 0.4, 0.4],
+                         [-61.7433, 12.0469, "Grenada", 0.4, 0.4],
+                         [-62.7079, 17.2889, "St Kitts & Nevis", 0.4, 0.4],
+                         [-61.1517, 13.1579, "St Vincent & Grenadines", 0.4, 0.4],
+                         [-60.9503, 13.7364, "St Lucia", 0.4, 0.4]])
+
 # Convert the initial and end date to datetime
 date_ini = datetime(int(date_ini[0:4]), int(date_ini[4:6]), int(date_ini[6:8]), int(date_ini[8:10]), int(date_ini[10:12]))
 date_end = datetime(int(date_end[0:4]), int(date_end[4:6]), int(date_end[6:8]), int(date_end[8:10]), int(date_end[10:12]))
 
-# Create our references for the loop
-date_loop = date_ini
+# Directory with the HMTL structure 
+outdir = "..//HTML//"
+
+# Maximum number of animation frames 
+max_files = 24  
+
+# Open the animation file (GIF: one palette for all the frames, with the colors of the color table)
+def open_loop_file(file_name):
+    return open_animation(file_name, fps=4, palette=LUT_palette(compile_CPT(cpt_file)))
+
+# Add the rendered frames, a list of (file name, scan date), to the animation (my_animation.html reads the list
+# of frames in 'frames.js') and to the animation file (opened with the first frame). Returns the animation file
+def publish_frames(frames, animation):
+    for frame, date in frames:
+        publish_frame(frame, date, outdir, max_files)
+        if loop_file and mode not in ('service', 'fazzt'):
+            if animation is None:
+                animation = open_loop_file(loop_file)
+            append_frame(animation, frame)
+        # In the service mode only the frames of the animation are kept
+        if mode in ('service', 'fazzt'):
+            os.remove(frame)
+
+    # Service mode: the animation file never ends, so a finished file with the current frames of the HTML 
+    # animation replaces the previous one (readers never see a file without its trailer)
+    if loop_file and frames and mode in ('service', 'fazzt'):
+        temp = os.path.splitext(loop_file)[0] + '.tmp' + os.path.splitext(loop_file)[1]
+        rotated = open_loop_file(temp)
+        for name in animation_frames(outdir):
+            append_frame(rotated, f'{outdir}/{name}')
+        close_animation(rotated)
+        os.replace(temp, loop_file)
+    return animation
 
 #-----------------------------------------------------------------------------------------------------------
 # LOOP BETWEEN START AND END DATES - DOWNLOAD, REPROJECTION AND PLOT
 #-----------------------------------------------------------------------------------------------------------
 
-# Loop between dates
-while (date_loop <= date_end):
+# The workers of the pool of processes import this script, so it runs only in the main process
+if __name__ == '__main__':
 
-    ###############
-    # DATA DOWNLOAD
-    ###############
-    
-    # Time / Date for download
-    date = date_loop.strftime('%Y%m%d%H%M')
-    print('\nDownload time and date:', date)
-    
-    # Download the GOES-R file
-    file_name = download_CMI(date, band, input)
-    
-    # Read the image
-    file = Dataset(f'{input}/{file_name}.nc')
+    # Delete all existent files in the 'Output' directory 
+    files = glob.glob('..//Output//*')
+    for f in files:
+        os.remove(f)
 
-    # Read the band number from the Metadata
-    band = str(file.variables['band_id'][0]).zfill(2)
-    
-    #-----------------------------------------------------------------------------------------------------------
-    ########################
-    # REPROJECTION WITH GDAL
-    ########################
-    print("Reprojecting the image")
-    
-    # Variable
-    var = 'CMI'
-
-    # Open the file
-    img = gdal.Open(f'NETCDF:{input}/{file_name}.nc:' + var)
-
-    # Read the header metadata
-    metadata = img.GetMetadata()
-    scale = float(metadata.get(var + '#scale_factor'))
-    offset = float(metadata.get(var + '#add_offset'))
-    undef = float(metadata.get(var + '#_FillValue'))
-    dtime = metadata.get('NC_GLOBAL#time_coverage_start')
-
-    # Load the data
-    ds = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
-
-    # Apply the scale, offset
-    ds = (ds * scale + offset) 
-
-    # Read the original file projection and configure the output projection
-    source_prj = osr.SpatialReference()
-    source_prj.ImportFromProj4(img.GetProjectionRef())
-
-    target_prj = osr.SpatialReference()
-    target_prj.ImportFromProj4("+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs")
-
-    # Reproject the data
-    GeoT = img.GetGeoTransform()
-    driver = gdal.GetDriverByName('MEM')
-    raw = driver.Create('raw', ds.shape[0], ds.shape[1], 1, gdal.GDT_Float32)
-    raw.SetGeoTransform(GeoT)
-    raw.GetRasterBand(1).WriteArray(ds)
-
-    # Define the parameters of the output file  
-    kwargs = {'format': 'netCDF', \
-              'srcSRS': source_prj, \
-              'dstSRS': target_prj, \
-              'outputBounds': (extent[0], extent[3], extent[2], extent[1]), \
-              'outputBoundsSRS': target_prj, \
-              'outputType': gdal.GDT_Float32, \
-              'srcNodata': undef, \
-              'dstNodata': 'nan', \
-              'xRes': 0.02, \
-              'yRes': 0.02, \
-              'resampleAlg': gdal.GRA_NearestNeighbour}
-
-    # Write the reprojected file on disk
-    gdal.Warp(f'{output}/{file_name}_rep.nc', raw, **kwargs)
-    
-    #-----------------------------------------------------------------------------------------------------------
-    ###########################
-    # OPEN THE REPROJECTED FILE
-    ###########################
-    
-    # Open the reprojected GOES-R image
-    file = Dataset(f'{output}/{file_name}_rep.nc')
+    # Delete the frames of the previous animation
+    clear_animation("..//HTML//")
+
+    # Frames being rendered by the pool of processes and frames ready for the animation (with their scan dates)
+    pending = []
+    rendered = []
+
+    # Animation file (opened with the first frame)
+    animation = None
+
+    # Dates to process: between the start and end dates or, in the service and fazzt modes, each new scan (forever)
+    if mode == 'service':
+        dates = scan_times(interval)
+    elif mode == 'fazzt':
+        dates = received_scans(fazzt_dir, band, input)
+    else:
+        dates = [date_ini + timedelta(minutes=interval * i) for i in range(int((date_end - date_ini) / timedelta(minutes=interval)) + 1)]
+
+    try:
+        # Loop between dates
+        for date_loop in dates:
+
+            ###############
+            # DATA DOWNLOAD
+            ###############
+    
+            # Time / Date for download
+            date = date_loop.strftime('%Y%m%d%H%M')
+            print('\nDownload time and date:', date)
+    
+            # Download the GOES-R file (in the 'fazzt' mode, the file received is already in the input directory, and
+            # in the 'service' mode, a file not yet on the cloud is downloaded as soon as it arrives)
+            if mode == 'fazzt':
+                file_name = os.path.basename(sorted(glob.glob(f'{input}/OR_ABI-L2-CMIPF-M*C{int(band):02d}_G??_s{date_loop.strftime("%Y%j%H%M")}*.nc'))[-1])[:-3]
+            elif mode == 'service':
+                file_name = wait_CMI(date, band, input)
+            else:
+                file_name = download_CMI(date, band, input)
+
+            # Skip the date if the file is not available
+            if file_name == -1:
+                continue
+    
+            # Read the image
+            file = Dataset(f'{input}/{file_name}.nc')
+
+            # Read the band number from the Metadata
+            band = str(file.variables['band_id'][0]).zfill(2)
+    
+            #-----------------------------------------------------------------------------------------------------------
+            ########################
+            # REPROJECTION WITH GDAL
+            ########################
+            print("Reprojecting the image")
+    
+            # Variable
+            var = 'CMI'
+
+            # Open the file
+            img = gdal.Open(f'NETCDF:{input}/{file_name}.nc:' + var)
+
+            # Read the header metadata
+            metadata = img.GetMetadata()
+            scale = float(metadata.get(var + '#scale_factor'))
+            offset = float(metadata.get(var + '#add_offset'))
+            undef = float(metadata.get(var + '#_FillValue'))
+            dtime = metadata.get('NC_GLOBAL#time_coverage_start')
+
+            # Load the data
+            ds = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
+
+            # Pixels without data (from the raw values, before the scale and offset)
+            nodata = ds == undef
+
+            # Apply the scale, offset
+            ds = (ds * scale + offset) 
+
+            if reprojection == 'lut':
+
+                # Reproject with the table of pixel indices (computed only for the first image)
+                ds[nodata] = np.nan
+                warp_table = warp_LUT(img.GetGeoTransform(), ds.shape, extent, 0.02)
+                data = np.ma.masked_invalid(warp(ds, warp_table))
+
+            else:
+
+                # Read the original file projection and configure the output projection
+                source_prj = osr.SpatialReference()
+                source_prj.ImportFromProj4(img.GetProjectionRef())
+
+                target_prj = osr.SpatialReference()
+                target_prj.ImportFromProj4("+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs")
+
+                # Reproject the data
+                GeoT = img.GetGeoTransform()
+                driver = gdal.GetDriverByName('MEM')
+                raw = driver.Create('raw', ds.shape[0], ds.shape[1], 1, gdal.GDT_Float32)
+                raw.SetGeoTransform(GeoT)
+                raw.GetRasterBand(1).WriteArray(ds)
+
+                # Define the parameters of the output file  
+                kwargs = {'format': 'netCDF', \
+                          'srcSRS': source_prj, \
+                          'dstSRS': target_prj, \
+                          'outputBounds': (extent[0], extent[3], extent[2], extent[1]), \
+                          'outputBoundsSRS': target_prj, \
+                          'outputType': gdal.GDT_Float32, \
+                          'srcNodata': undef, \
+                          'dstNodata': 'nan', \
+                          'xRes': 0.02, \
+                          'yRes': 0.02, \
+                          'resampleAlg': gdal.GRA_NearestNeighbour}
+
+                # Write the reprojected file on disk
+                gdal.Warp(f'{output}/{file_name}_rep.nc', raw, **kwargs)
+    
+                #-----------------------------------------------------------------------------------------------------------
+                ###########################
+                # OPEN THE REPROJECTED FILE
+                ###########################
+    
+                # Open the reprojected GOES-R image
+                file = Dataset(f'{output}/{file_name}_rep.nc')
+
+                # Get the pixel values from the reprojected file
+                data = file.variables['Band1'][:]
+            #-----------------------------------------------------------------------------------------------------------
+    
+            ################
+            # PLOT THE IMAGE
+            ################
+            print("Plotting the image")
+    
+            # Colormap, minimums and maximums, thick interval and legend configuration
+            if int(band) <= 6:
+                # Converts a CPT file to be used in Python
+                cpt_file = '..//Colortables//Square Root Visible Enhancement.cpt'
+                cmap = loadCPT_cmap(cpt_file)
+                vmin = 0.0
+                vmax = 1.0
+                thick_interval = 0.1
+                legend_title = 'Reflectance Factor'
+            elif int(band) == 7:
+                # Converts a CPT file to be used in Python
+                cpt_file = '..//Colortables//SVGAIR2_TEMP.cpt'
+                cmap = loadCPT_cmap(cpt_file)
+                data -= 273.15
+                vmin = -112.15
+                vmax = 56.85
+                thick_interval = 10.0
+                legend_title = 'Brightness Temperatures (°C)'
+            elif int(band) > 7 and int(band) < 11:
+                # Converts a CPT file to be used in Python
+                cpt_file = '..//Colortables//SVGAWVX_TEMP.cpt'
+                cmap = loadCPT_cmap(cpt_file)
+                data -= 273.15
+                vmin = -112.15
+                vmax = 56.85
+                thick_interval = 10.0
+                legend_title = 'Brightness Temperatures (°C)'
+            elif int(band) > 10:# and int(band) < 14:
+                # Converts a CPT file to be used in Python
+                cpt_file = '..//Colortables//IR4AVHRR6.cpt'
+                cmap = loadCPT_cmap(cpt_file)
+                data -= 273.15    
+                vmin = -103.0
+                vmax = 84.0
+                thick_interval = 10.0
+                legend_title = 'Brightness Temperatures (°C)'
+    
+            #-----------------------------------------------------------------------------------------------------------
+        
+            if renderer == 'raster':
 
-    # Get the pixel values from the reprojected file
-    data = file.variables['Band1'][:]
-    #-----------------------------------------------------------------------------------------------------------
-    
-    ################
-    # PLOT THE IMAGE
-    ################
-    print("Plotting the image")
-    
-    # Colormap, minimums and maximums, thick interval and legend configuration
-    if int(band) <= 6:
-        # Converts a CPT file to be used in Python
-        cpt = loadCPT('..//Colortables//Square Root Visible Enhancement.cpt')
-        cmap = LinearSegmentedColormap('cpt', cpt)
-        vmin = 0.0
-        vmax = 1.0
-        thick_interval = 0.1
-        legend_title = 'Reflectance Factor'
-    elif int(band) == 7:
-        # Converts a CPT file to be used in Python
-        cpt = loadCPT('..//Colortables//SVGAIR2_TEMP.cpt')
-        cmap = LinearSegmentedColormap('cpt', cpt) 
-        data -= 273.15
-        vmin = -112.15
-        vmax = 56.85
-        thick_interval = 10.0
-        legend_title = 'Brightness Temperatures (°C)'
-    elif int(band) > 7 and int(band) < 11:
-        # Converts a CPT file to be used in Python
-        cpt = loadCPT('..//Colortables//SVGAWVX_TEMP.cpt')
-        cmap = LinearSegmentedColormap('cpt', cpt) 
-        data -= 273.15
-        vmin = -112.15
-        vmax = 56.85
-        thick_interval = 10.0
-        legend_title = 'Brightness Temperatures (°C)'
-    elif int(band) > 10:# and int(band) < 14:
-        # Converts a CPT file to be used in Python
-        cpt = loadCPT('..//Colortables//IR4AVHRR6.cpt')   
-        cmap = LinearSegmentedColormap('cpt', cpt) 
-        data -= 273.15    
-        vmin = -103.0
-        vmax = 84.0
-        thick_interval = 10.0
-        legend_title = 'Brightness Temperatures (°C)'
-    
-    #-----------------------------------------------------------------------------------------------------------
+                ###############################
+                # FAST RENDERING (NO MATPLOTLIB)
+                ###############################
         
-    ###########################
-    # IMAGE SIZE AND PROJECTION
-    ###########################
-    
-    # Choose the plot size (width x height, in inches)
-    dpi = 150
-    fig = plt.figure(figsize=(data.shape[1]/float(dpi), data.shape[0]/float(dpi)), dpi=dpi)
-    
-    # Define the projection
-    proj = ccrs.PlateCarree()
+                # Lookup table of the CPT (compiled once and cached on disk)
+                lut = compile_CPT(cpt_file)
+        
+                # Extract the time / date from the NetCDF
+                date = (datetime.strptime(dtime, '%Y-%m-%dT%H:%M:%S.%fZ')).strftime('%Y-%m-%d %H:%M')
+
+                # Layers: map elements (rasterized once and cached on disk), title, logo and colorbar
+                overlay = map_overlay(extent, data.shape, map_style)
+                title = text_layer(f'GEONETCast-Americas Training for Eastern Caribbean States - GOES-16 Band {band} {date} UTC', size=int(data.shape[0] * 0.012))
+                my_logo = load_layer('..//Logos//my_logo.png', width=int(data.shape[1] * 0.10))
+                ticks = np.arange(vmin, vmax, thick_interval)
+                ticks = (thick_interval * np.round(ticks / thick_interval))[1:]
+                colorbar = colorbar_layer(lut, data.shape[1], int(data.shape[0] * 0.01), vmin, vmax, ticks, legend_title, size=int(data.shape[0] * 0.008))
+                layers = [(overlay, 0, 0), (title, 10, 10), (my_logo, 10, -int(data.shape[0] * 0.03)), (colorbar, 0, -1)]
+        
+                # Save the image
+                render_frame(f'{output}/{file_name}_rep.png', data, lut, vmin, vmax, layers)
+                rendered.append((f'{output}/{file_name}_rep.png', date_loop))
 
-    # Use the PlateCarree projection in cartopy
-    ax = plt.axes([0, 0, 1, 1], projection=proj)
-    ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
+            elif renderer == 'template':
 
-    # Define the image extent
-    img_extent = [extent[0], extent[2], extent[1], extent[3]]
-        
-    # Plot the image
-    img = ax.imshow(data, origin='upper', vmin=vmin, vmax=vmax, extent=img_extent, cmap=cmap)
+                ##################################
+                # RENDERING WITH A FIGURE TEMPLATE
+                ##################################
 
-    ##########################
-    # ADD ELEMENTS TO THE PLOT
-    ##########################
-    
-    # To put colorbar inside picture
-    axins1 = inset_axes(ax, width="100%", height="1%", loc='lower center', borderpad=0.0)
-
-    # Add a shapefile
-    shapefile = list(shpreader.Reader('..//Shapefiles//ne_10m_admin_1_states_provinces.shp').geometries())
-    ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='white',facecolor='none', linewidth=0.5)
-
-    # Add coastlines, borders and gridlines
-    ax.coastlines(resolution='10m', color='cyan', linewidth=2.0)
-    ax.add_feature(cartopy.feature.BORDERS, edgecolor='turquoise', linewidth=1.0)
-    gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=0.5, linestyle='--', linewidth=1.0, xlocs=np.arange(-180, 180, 5), ylocs=np.arange(-90, 90, 5), draw_labels=True)
-    gl.bottom_labels = False
-    gl.right_labels = False
-    gl.xpadding = -5
-    gl.ypadding = -15
-
-    # Extract the time / date from the NetCDF
-    date = (datetime.strptime(dtime, '%Y-%m-%dT%H:%M:%S.%fZ'))
-
-    # Add a title
-    date = date.strftime('%Y-%m-%d %H:%M')
-    plt.annotate(f'GEONETCast-Americas Training for Eastern Caribbean States - GOES-16 Band {band} {date} UTC', xy=(0.01, 0.97), xycoords='figure fraction', fontsize=15, fontweight='bold', color='white', bbox=dict(boxstyle="round",fc=(0.0, 0.0, 0.0), ec=(1., 1., 1.)))
-
-    # Add logos / images to the plot
-    my_logo = plt.imread('..//Logos//my_logo.png')
-    newax = fig.add_axes([0.01, 0.03, 0.10, 0.10], anchor='SW') #  [left, bottom, width, height]. All quantities are in fractions of figure width and height.
-    newax.imshow(my_logo)
-    newax.axis('off')
-    
-    # Add a colorbar inside the plot
-    ticks = np.arange(vmin, vmax, thick_interval).tolist()     
-    ticks =  thick_interval * np.round(np.true_divide(ticks,thick_interval))
-    ticks = ticks[1:]
-    cb = fig.colorbar(img, cax=axins1, orientation="horizontal", ticks=ticks)
-    cb.set_label(label=legend_title, color='black', size=10, weight='bold')
-    cb.outline.set_visible(False)
-    cb.ax.tick_params(width = 0)
-    cb.ax.xaxis.set_tick_params(pad=-int(data.shape[0] * 0))
-    cb.ax.xaxis.set_ticks_position('top')
-    cb.ax.xaxis.set_label_position('top')
-    cb.ax.tick_params(axis='x', colors='black', labelsize=int(data.shape[0] * 0.005))
-
-    ################
-    # ADD A SCALEBAR
-    ################
-    
-    # Add a scalebar
-    from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
-    import matplotlib.font_manager as fm
-    fontprops = fm.FontProperties(size=10)
-    distance = 1000
-    scalebar = AnchoredSizeBar(ax.transData,
-                              (distance / 111),
-                              str(distance) + ' km',
-                              loc='lower right',
-                              pad=0.1,
-                              borderpad=2.5,
-                              color='black',
-                              frameon=True,
-                              label_top=True,
-                              sep=5,
-                              size_vertical=0.5,
-                              fontproperties=fontprops
-                              )
-    ax.add_artist(scalebar)
-    
-    # Plot the N arrow
-    import matplotlib.patheffects as patheffects
-    buffer = [patheffects.withStroke(linewidth=5, foreground="w")]
-    t1 = ax.text(0.91, 0.070, u'\u25B2\nN', transform=ax.transAxes,
-    horizontalalignment='center', verticalalignment='bottom',
-    path_effects=buffer)
-
-    ################
-    # ADD LABELS
-    ################
-    
-    # Add a circle
-    ax.plot(-61.7927, 17.1402, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
-    # Add a text
-    txt = ax.text(-61.7927 + 0.4, 17.1402 + 0.1, "Antigua and Barbuda", fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
-    # Style the text
-    txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
-
-    # Add a circle
-    ax.plot(-59.4870, 13.0858, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
-    # Add a text
-    txt = ax.text(-59.4870 + 0.4, 13.0858 + 0.0, "Barbados", fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
-    # Style the text
-    txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
-    
-    # Add a circle
-    ax.plot(-61.3916, 15.3388, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
-    # Add a text
-    txt = ax.text(-61.3916 + 0.4, 15.3388 + 0.4, "Dominica", fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
-    # Style the text
-    txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
-
-    # Add a circle
-    ax.plot(-61.7433, 12.0469, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
-    # Add a text
-    txt = ax.text(-61.7433 + 0.4, 12.0469 + 0.4, "Grenada", fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
-    # Style the text
-    txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
-    
-    # Add a circle
-    ax.plot(-62.7079, 17.2889, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
-    # Add a text
-    txt = ax.text(-62.7079 + 0.4, 17.2889 + 0.4, "St Kitts & Nevis", fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
-    # Style the text
-    txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
-    
-    # Add a circle
-    ax.plot(-61.1517, 13.1579, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
-    # Add a text
-    txt = ax.text(-61.1517 + 0.4, 13.1579 + 0.4, "St Vincent & Grenadines", fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
-    # Style the text
-    txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
-    
-    # Add a circle
-    ax.plot(-60.9503, 13.7364, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
-    # Add a text
-    txt = ax.text(-60.9503 + 0.4, 13.7364 + 0.4, "St Lucia", fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
-    # Style the text
-    txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
-    
-    #-----------------------------------------------------------------------------------------------------------
-    
-    ###########################################
-    # SAVE THE IMAGE AND DELETE AUXILIARY FILES
-    ###########################################
+                # Figure configuration (the figure is built in the first frame, then only the image and the title change)
+                config = {'extent': extent, 'shape': data.shape, 'cpt_file': cpt_file, 'vmin': vmin, 'vmax': vmax, 
+                          'thick_interval': thick_interval, 'legend_title': legend_title, 'style': map_style,
+                          'logo': '..//Logos//my_logo.png'}
+
+                # Extract the time / date from the NetCDF
+                date = (datetime.strptime(dtime, '%Y-%m-%dT%H:%M:%S.%fZ')).strftime('%Y-%m-%d %H:%M')
+
+                title = f'GEONETCast-Americas Training for Eastern Caribbean States - GOES-16 Band {band} {date} UTC'
+
+                # Save the image (in this process or in the pool of processes)
+                if workers > 1:
+                    pending.append((render_pool(workers).submit(plot_frame, f'{output}/{file_name}_rep.png', data, title, config), date_loop))
+                else:
+                    plot_frame(f'{output}/{file_name}_rep.png', data, title, config)
+                    rendered.append((f'{output}/{file_name}_rep.png', date_loop))
+
+                # Keep at most 'workers' frames in the pool (in the service mode, each frame is published as soon as it is ready)
+                while pending and (len(pending) >= workers or mode in ('service', 'fazzt')):
+                    future, date_frame = pending.pop(0)
+                    rendered.append((future.result(), date_frame))
+
+            else:
+
+                ###########################
+                # IMAGE SIZE AND PROJECTION
+                ###########################
     
-    # Save the image
-    plt.savefig(f'{output}/{file_name}_rep.png', bbox_inches='tight', pad_inches=0, dpi=300)
+                # Choose the plot size (width x height, in inches)
+                dpi = 150
+                fig = plt.figure(figsize=(data.shape[1]/float(dpi), data.shape[0]/float(dpi)), dpi=dpi)
     
-    # Delete the original and the reprojected NetCDF files
-    import os
-    file.close()
-    os.remove(f'{output}/{file_name}_rep.nc')
-    os.remove(f'{input}/{file_name}.nc')
+                # Define the projection
+                proj = ccrs.PlateCarree()
+
+                # Use the PlateCarree projection in cartopy
+                ax = plt.axes([0, 0, 1, 1], projection=proj)
+                ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
+
+                # Define the image extent
+                img_extent = [extent[0], extent[2], extent[1], extent[3]]
+        
+                # Plot the image
+                img = ax.imshow(data, origin='upper', vmin=vmin, vmax=vmax, extent=img_extent, cmap=cmap)
+
+                ##########################
+                # ADD ELEMENTS TO THE PLOT
+                ##########################
+    
+                # To put colorbar inside picture
+                axins1 = inset_axes(ax, width="100%", height="1%", loc='lower center', borderpad=0.0)
+
+                # Add the shapefile, coastlines, borders, gridlines and labels
+                add_map_elements(ax, map_style)
+
+                # Extract the time / date from the NetCDF
+                date = (datetime.strptime(dtime, '%Y-%m-%dT%H:%M:%S.%fZ'))
+
+                # Add a title
+                date = date.strftime('%Y-%m-%d %H:%M')
+                plt.annotate(f'GEONETCast-Americas Training for Eastern Caribbean States - GOES-16 Band {band} {date} UTC', xy=(0.01, 0.97), xycoords='figure fraction', fontsize=15, fontweight='bold', color='white', bbox=dict(boxstyle="round",fc=(0.0, 0.0, 0.0), ec=(1., 1., 1.)))
+
+                # Add logos / images to the plot
+                my_logo = plt.imread('..//Logos//my_logo.png')
+                newax = fig.add_axes([0.01, 0.03, 0.10, 0.10], anchor='SW') #  [left, bottom, width, height]. All quantities are in fractions of figure width and height.
+                newax.imshow(my_logo)
+                newax.axis('off')
+    
+                # Add a colorbar inside the plot
+                ticks = np.arange(vmin, vmax, thick_interval).tolist()     
+                ticks =  thick_interval * np.round(np.true_divide(ticks,thick_interval))
+                ticks = ticks[1:]
+                cb = fig.colorbar(img, cax=axins1, orientation="horizontal", ticks=ticks)
+                cb.set_label(label=legend_title, color='black', size=10, weight='bold')
+                cb.outline.set_visible(False)
+                cb.ax.tick_params(width = 0)
+                cb.ax.xaxis.set_tick_params(pad=-int(data.shape[0] * 0))
+                cb.ax.xaxis.set_ticks_position('top')
+                cb.ax.xaxis.set_label_position('top')
+                cb.ax.tick_params(axis='x', colors='black', labelsize=int(data.shape[0] * 0.005))
+
+                ################
+                # ADD A SCALEBAR
+                ################
+    
+                # Add a scalebar
+                from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
+                import matplotlib.font_manager as fm
+                fontprops = fm.FontProperties(size=10)
+                distance = 1000
+                scalebar = AnchoredSizeBar(ax.transData,
+                                          (distance / 111),
+                                          str(distance) + ' km',
+                                          loc='lower right',
+                                          pad=0.1,
+                                          borderpad=2.5,
+                                          color='black',
+                                          frameon=True,
+                                          label_top=True,
+                                          sep=5,
+                                          size_vertical=0.5,
+                                          fontproperties=fontprops
+                                          )
+                ax.add_artist(scalebar)
+    
+                # Plot the N arrow
+                import matplotlib.patheffects as patheffects
+                buffer = [patheffects.withStroke(linewidth=5, foreground="w")]
+                t1 = ax.text(0.91, 0.070, u'\u25B2\nN', transform=ax.transAxes,
+                horizontalalignment='center', verticalalignment='bottom',
+                path_effects=buffer)
+
+                #-----------------------------------------------------------------------------------------------------------
+    
+                ################
+                # SAVE THE IMAGE
+                ################
+    
+                # Save the image
+                plt.savefig(f'{output}/{file_name}_rep.png', bbox_inches='tight', pad_inches=0, dpi=300)
+                rendered.append((f'{output}/{file_name}_rep.png', date_loop))
+
+            ##########################
+            # DELETE AUXILIARY FILES
+            ##########################
+    
+            # Delete the original and the reprojected NetCDF files
+            file.close()
+            if reprojection != 'lut':
+                os.remove(f'{output}/{file_name}_rep.nc')
+            os.remove(f'{input}/{file_name}.nc')
        
-    ######################
-    # UPDATE THE ANIMATION
-    ######################
+            ######################
+            # UPDATE THE ANIMATION
+            ######################
     
-    print("Updating the animation")
+            print("Updating the animation")
     
-    # Create a list that will store the files
-    files = []
+            # Add the new images to the animation
+            animation = publish_frames(rendered, animation)
+            rendered = []
     
-    # Directory with the images
-    directory = "..//Output//"
-    
-    # Directory with the HMTL structure 
-    outdir = "..//HTML//"
-    
-    # File identifier (unique string inside the file name)
-    identifier = 'OR_ABI-L2-CMIPF-*.png'
-    
-    # Rename string (the final file name for the animation will be this + a number
-    rename_id = 'img_'
-    
-    # Add to the list the files in the dir that matches the identifier
-    for filename in sorted(glob.glob(directory + identifier)):
-        files.append(filename)
-    
-    # Maximum number of animation frames 
-    max_files = 24  
-    
-    # Keep on the list only the max number of files
-    files = files[-max_files:]
-    
-    # Copy the files to the HTML Output folder, following the HTML naming convention
-    for idx, val in enumerate(files):
-        src = val
-        dst = outdir + rename_id + str(idx + 1) + '.png'
-        copyfile(src, dst)    
-    
-    # Get the number of files on the folder
-    num_files = len(files)
-    
-    # Get the difference of desired files and available files
-    diff_files = max_files - num_files
-    
-    # If there are less files than the maximum HTML animation files, repeat the last one "x" times
-    if diff_files > 0:
-        for i in range(diff_files):
-            dst = outdir + rename_id + str(num_files + i + 1) + '.png'       
-            copyfile(files[-1], dst)
-    
-    # Close the image
-    plt.close()
-        
-    # Increment the date_ini
-    date_loop = date_loop + timedelta(minutes=interval)
\ No newline at end of file
+            # Close the image
+            plt.close()
+
+        # Wait for the frames still in the pool of processes (e.g. when the last dates have no file) and publish them
+        animation = publish_frames([(future.result(), date_frame) for future, date_frame in pending], animation)
+        pending = []
+
+    finally:
+        # Close the pool of processes and finish the animation file
+        close_render_pool()
+        if animation:
+            close_animation(animation)
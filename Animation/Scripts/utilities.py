@@ -3,7 +3,6 @@
 # Required modules
 import os                                # Miscellaneous operating system interfaces
 import numpy as np                       # Import the Numpy package
-import colorsys                          # To make convertion of colormaps
 import boto3                             # Amazon Web Services (AWS) SDK for Python
 from botocore import UNSIGNED            # boto3 config
 from botocore.config import Config       # boto3 config
@@ -31,47 +30,48 @@ def loadCPT(path):
 
     f.close()
 
-    x = np.array([])
-    r = np.array([])
-    g = np.array([])
-    b = np.array([])
+    x = []
+    colors = []
+
+    # Background (B), foreground (F) and NaN (N) colors
+    special = {}
 
     colorModel = 'RGB'
 
     for l in lines:
         ls = l.split()
+        if len(ls) == 0:
+            continue
         if l[0] == '#':
             if ls[-1] == 'HSV':
                 colorModel = 'HSV'
-                continue
-            else:
-                continue
+            continue
         if ls[0] == 'B' or ls[0] == 'F' or ls[0] == 'N':
-            pass
+            try:
+                special[ls[0]] = [float(v) for v in ls[1:4]]
+            except ValueError:
+                pass
         else:
-            x=np.append(x,float(ls[0]))
-            r=np.append(r,float(ls[1]))
-            g=np.append(g,float(ls[2]))
-            b=np.append(b,float(ls[3]))
-            xtemp = float(ls[4])
-            rtemp = float(ls[5])
-            gtemp = float(ls[6])
-            btemp = float(ls[7])
-
-        x=np.append(x,xtemp)
-        r=np.append(r,rtemp)
-        g=np.append(g,gtemp)
-        b=np.append(b,btemp)
+            x.append(float(ls[0]))
+            colors.append([float(v) for v in ls[1:4]])
+            x.append(float(ls[4]))
+            colors.append([float(v) for v in ls[5:8]])
+
+    # Convert all the colors (stops and B / F / N) to RGB (0 - 1) at once
+    keys = [k for k in ['B', 'F', 'N'] if len(special.get(k, [])) == 3]
+    colors = np.array(colors + [special[k] for k in keys], dtype=float).reshape(-1, 3)
 
     if colorModel == 'HSV':
-        for i in range(r.shape[0]):
-            rr, gg, bb = colorsys.hsv_to_rgb(r[i]/360.,g[i],b[i])
-        r[i] = rr ; g[i] = gg ; b[i] = bb
+        colors = hsv2rgb(colors[:, 0]/360., colors[:, 1], colors[:, 2])
 
     if colorModel == 'RGB':
-        r = r/255.0
-        g = g/255.0
-        b = b/255.0
+        colors = colors/255.0
+
+    x = np.array(x)
+    r = colors[:len(x), 0]
+    g = colors[:len(x), 1]
+    b = colors[:len(x), 2]
+    special = dict(zip(keys, colors[len(x):].tolist()))
 
     xNorm = (x - x[0])/(x[-1] - x[0])
 
@@ -86,7 +86,131 @@ def loadCPT(path):
 
     colorDict = {'red': red, 'green': green, 'blue': blue}
 
+    # Under / over / bad colors from the B / F / N entries (ignored by LinearSegmentedColormap, see loadCPT_cmap)
+    for k, name in [('B', 'under'), ('F', 'over'), ('N', 'bad')]:
+        if k in special:
+            colorDict[name] = special[k]
+
     return colorDict
+
+# Vectorized HSV to RGB conversion (hue, saturation and value from 0 to 1), returns a (n, 3) array
+def hsv2rgb(h, s, v):
+    h = np.asarray(h, dtype=float)
+    s = np.asarray(s, dtype=float)
+    v = np.asarray(v, dtype=float)
+    i = np.floor(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(int) % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=1)
+
+# Load a CPT file as a matplotlib colormap (cached in memory, keyed by the CPT modification time). With 
+# 'special', the B / F / N entries are the under / over / bad colors; by default, the values out of the range
+# have the colors of the ends of the table and the NaNs are transparent
+CPT_CMAPS = {}
+
+def loadCPT_cmap(path, name='cpt', special=False):
+    from matplotlib.colors import LinearSegmentedColormap
+
+    key = (os.path.abspath(path), name, special, os.path.getmtime(path) if os.path.exists(path) else None)
+    if key in CPT_CMAPS:
+        return CPT_CMAPS[key]
+
+    cpt = loadCPT(path)
+    if cpt is None:
+        return None
+
+    cmap = LinearSegmentedColormap(name, cpt)
+    if special:
+        for color, set_color in [('under', cmap.set_under), ('over', cmap.set_over), ('bad', cmap.set_bad)]:
+            if color in cpt:
+                set_color(cpt[color])
+    CPT_CMAPS[key] = cmap
+    return cmap
+
+#-----------------------------------------------------------------------------------------------------------
+# Compile a CPT file into a lookup table (LUT): a (n + 3, 4) uint8 RGBA array with n colors, followed by
+# the under (n), over (n + 1) and bad / NaN (n + 2) colors: the ends of the table and transparent or, with
+# 'special', the B / F / N entries of the CPT. The LUT is cached in memory and on disk (cache_dir, by default
+# a 'LUT_cache' directory next to the CPT file), keyed by the CPT modification time
+CPT_LUTS = {}
+
+def compile_CPT(path, n=256, cache_dir=None, special=False):
+
+    mtime = os.path.getmtime(path)
+    key = (os.path.abspath(path), n, special, mtime)
+    if key in CPT_LUTS:
+        return CPT_LUTS[key]
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), 'LUT_cache')
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_file = f'{cache_dir}/{name}_{n}{"_special" if special else ""}_{int(mtime * 1e6)}.npy'
+
+    if os.path.exists(cache_file):
+        lut = np.load(cache_file)
+    else:
+        # Interpolate the CPT colors for n equally spaced values
+        cpt = loadCPT(path)
+        if cpt is None:
+            return None
+        xNorm = np.array([s[0] for s in cpt['red']])
+        values = (np.arange(n) + 0.5) / n
+        lut = np.zeros((n + 3, 4), dtype=np.uint8)
+        for i, color in enumerate(['red', 'green', 'blue']):
+            lut[:n, i] = np.rint(255 * np.interp(values, xNorm, [s[1] for s in cpt[color]]))
+        lut[:n, 3] = 255
+        # Under, over and bad colors (from the B / F / N entries of the CPT, when asked and available)
+        lut[n] = lut[0]
+        lut[n + 1] = lut[n - 1]
+        lut[n + 2] = (0, 0, 0, 0)
+        for name, row in [('under', n), ('over', n + 1), ('bad', n + 2)]:
+            if special and name in cpt:
+                lut[row, :3] = np.rint(255 * np.array(cpt[name]))
+                lut[row, 3] = 255
+
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_file, lut)
+
+    CPT_LUTS[key] = lut
+    return lut
+
+# Apply a LUT (see compile_CPT) to an array, returning a (lines, cols, 4) uint8 RGBA image.
+# Values are scaled between vmin and vmax into the LUT indices, so coloring is a single gather.
+def apply_LUT(data, lut, vmin, vmax):
+
+    n = lut.shape[0] - 3
+
+    scaled = np.ma.filled(np.ma.asarray(data, dtype=np.float32), np.nan) - np.float32(vmin)
+    np.multiply(scaled, np.float32(n / (vmax - vmin)), out=scaled)
+
+    bad = np.isnan(scaled)
+    under = scaled < 0
+    over = scaled > n
+    np.clip(scaled, 0, n - 1, out=scaled)
+    scaled[bad] = 0
+
+    index = scaled.astype(np.intp)
+    index[under] = n
+    index[over] = n + 1
+    index[bad] = n + 2
+
+    return lut[index]
+#-----------------------------------------------------------------------------------------------------------
+# S3 client for the AMAZON repositories (anonymous access). It is created only once per process and shared 
+# by the download functions (the client is thread safe)
+S3_CLIENTS = {}
+
+def get_s3_client():
+    if 's3' not in S3_CLIENTS:
+        S3_CLIENTS['s3'] = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+    return S3_CLIENTS['s3']
+
 #-----------------------------------------------------------------------------------------------------------
 def download_CMI(yyyymmddhhmn, band, path_dest):
 
@@ -103,7 +227,7 @@ def download_CMI(yyyymmddhhmn, band, path_dest):
   product_name = 'ABI-L2-CMIPF'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6C{int(band):02.0f}_G16_s{year}{day_of_year}{hour}{min}'
@@ -147,7 +271,7 @@ def download_PROD(yyyymmddhhmn, product_name, path_dest):
   bucket_name = 'noaa-goes16'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6_G16_s{year}{day_of_year}{hour}{min}'
@@ -192,7 +316,7 @@ def download_GLM(yyyymmddhhmnss, path_dest):
   bucket_name = 'noaa-goes16'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   product_name = "GLM-L2-LCFA"
@@ -312,3 +436,804 @@ def reproject(file_name, ncfile, array, extent, undef):
     # Write the reprojected file on disk
     gdal.Warp(file_name, raw, **kwargs)
 
+# Nearest neighbour reprojection of the GOES-16 Full Disk to a lat / lon grid with a table of pixel indices. 
+# 'geotransform' is the GDAL geotransform of the Full Disk (in meters), 'shape' its (lines, cols), 'extent' 
+# [min lon, min lat, max lon, max lat] and 'resolution' (degrees) are the ones of the output grid. The table 
+# is computed once and cached in memory, so each new image is reprojected with a single lookup (see warp)
+WARP_LUTS = {}
+
+def warp_LUT(geotransform, shape, extent, resolution):
+    key = (tuple(geotransform), tuple(shape), tuple(extent), resolution)
+    if key in WARP_LUTS:
+        return WARP_LUTS[key]
+
+    # GOES-16 fixed grid constants (see latlon2xy)
+    req = 6378137
+    rpol = 6356752.31414
+    e = 0.0818191910435
+    H = 42164160
+    lambda0 = -1.308996939
+
+    # Centers of the output pixels
+    lines = int(round((extent[3] - extent[1]) / resolution))
+    cols = int(round((extent[2] - extent[0]) / resolution))
+    lon = np.radians(extent[0] + (np.arange(cols) + 0.5) * resolution)[None, :]
+    lat = np.radians(extent[3] - (np.arange(lines) + 0.5) * resolution)[:, None]
+
+    # Scan angles (and visibility from the satellite) of each pixel
+    Phi_c = np.arctan(((rpol * rpol)/(req * req)) * np.tan(lat))
+    rc = rpol/(np.sqrt(1 - ((e * e) * (np.cos(Phi_c) * np.cos(Phi_c)))))
+    sx = H - (rc * np.cos(Phi_c) * np.cos(lon - lambda0))
+    sy = -rc * np.cos(Phi_c) * np.sin(lon - lambda0)
+    sz = rc * np.sin(Phi_c) * np.ones_like(lon)
+    x = np.arcsin((-sy)/np.sqrt((sx*sx) + (sy*sy) + (sz*sz)))
+    y = np.arctan(sz/sx)
+    visible = H * (H - sx) >= (sy * sy) + ((req * req)/(rpol * rpol)) * (sz * sz)
+
+    # Lines and columns of the Full Disk (the geotransform is in meters: scan angle x perspective point height)
+    height = H - req
+    col = np.floor((x * height - geotransform[0]) / geotransform[1]).astype(np.int64)
+    lin = np.floor((y * height - geotransform[3]) / geotransform[5]).astype(np.int64)
+    valid = visible & (col >= 0) & (col < shape[1]) & (lin >= 0) & (lin < shape[0])
+
+    lut = {'index': np.where(valid, lin * shape[1] + col, 0), 'valid': valid}
+    WARP_LUTS[key] = lut
+    return lut
+
+# Reproject an image with a table of pixel indices (see warp_LUT). The pixels out of the Full Disk are NaN
+def warp(data, lut):
+    image = np.asarray(data, dtype=np.float32).ravel()[lut['index']]
+    image[~lut['valid']] = np.nan
+    return image
+
+
+#-----------------------------------------------------------------------------------------------------------
+# Functions to render frames without matplotlib: the data is colored with a LUT (see compile_CPT) and
+# pre-rasterized RGBA layers (overlays, logo, colorbar, texts) are composited over it with numpy.
+# Layers are (array, x, y) tuples, where x, y is the position of the upper left corner of the layer
+# (negative values are counted from the right / bottom of the image).
+
+# Alpha composite an RGBA uint8 layer over an RGBA uint8 image, in place. The parts of the layer out of the
+# image are discarded
+def alpha_composite(image, layer, x=0, y=0):
+    if x < 0:
+        x = image.shape[1] - layer.shape[1] + x + 1
+    if y < 0:
+        y = image.shape[0] - layer.shape[0] + y + 1
+
+    # Clip the paste box to the image
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + layer.shape[1], image.shape[1]), min(y + layer.shape[0], image.shape[0])
+    if x1 <= x0 or y1 <= y0:
+        return image
+
+    dst = image[y0:y1, x0:x1]
+    src = layer[y0 - y:y1 - y, x0 - x:x1 - x]
+    alpha = src[..., 3:4].astype(np.uint16)
+    dst[..., :3] = (src[..., :3] * alpha + dst[..., :3] * (255 - alpha) + 127) // 255
+    dst[..., 3] = src[..., 3] + (dst[..., 3].astype(np.uint16) * (255 - src[..., 3]) + 127) // 255
+    return image
+
+# Read an image (e.g. a logo) as an RGBA uint8 layer, optionally resized to 'width' pixels.
+# The layers are cached in memory
+LAYERS = {}
+
+def load_layer(file_name, width=None):
+    from PIL import Image
+
+    key = (file_name, width)
+    if key not in LAYERS:
+        image = Image.open(file_name).convert('RGBA')
+        if width is not None:
+            image = image.resize((width, max(1, int(round(image.height * width / image.width)))), Image.LANCZOS)
+        LAYERS[key] = np.asarray(image).copy()
+    return LAYERS[key]
+
+# Font for the text layers (DejaVu, shipped with matplotlib, or the Pillow default font)
+def load_font(size, bold=True):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype('DejaVuSans-Bold.ttf' if bold else 'DejaVuSans.ttf', size)
+    except OSError:
+        try:
+            import matplotlib
+            return ImageFont.truetype(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans-Bold.ttf' if bold else 'DejaVuSans.ttf'), size)
+        except (ImportError, OSError):
+            return ImageFont.load_default()
+
+# Create a text layer (RGBA uint8), with an optional background box
+def text_layer(text, size=15, color=(255, 255, 255, 255), background=(0, 0, 0, 255), padding=5):
+    from PIL import Image, ImageDraw
+
+    font = load_font(size)
+    left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    image = Image.new('RGBA', (right - left + 2 * padding, bottom - top + 2 * padding), background)
+    ImageDraw.Draw(image).text((padding - left, padding - top), text, font=font, fill=color)
+    return np.asarray(image).copy()
+
+# Create a horizontal colorbar layer (RGBA uint8) from a LUT, with the tick labels and title above the bar
+# (cached in memory, like the image layers)
+def colorbar_layer(lut, width, height, vmin, vmax, ticks=(), title='', size=12, color=(0, 0, 0, 255)):
+    from PIL import Image, ImageDraw
+
+    key = ('colorbar', lut.tobytes(), width, height, vmin, vmax, tuple(ticks), title, size, color)
+    if key in LAYERS:
+        return LAYERS[key]
+
+    n = lut.shape[0] - 3
+    font = load_font(size)
+    text_height = 2 * (size + 4)
+
+    image = Image.new('RGBA', (width, height + text_height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    if title:
+        draw.text((width // 2, 0), title, font=font, fill=color, anchor='mt')
+    for tick in ticks:
+        x = int(round((tick - vmin) / (vmax - vmin) * (width - 1)))
+        draw.text((x, size + 4), f'{tick:g}', font=font, fill=color, anchor='mt')
+
+    layer = np.asarray(image).copy()
+    index = (np.arange(width) * n // width).astype(np.intp)
+    layer[text_height:, :, :] = lut[index][None, :, :]
+    LAYERS[key] = layer
+    return layer
+
+# Render a frame: colors the data with the LUT, composites the layers and writes the image
+# (PNG or WebP, according to the file extension) with Pillow
+def render_frame(file_name, data, lut, vmin, vmax, layers=()):
+    from PIL import Image
+
+    image = apply_LUT(data, lut, vmin, vmax)
+    for layer, x, y in layers:
+        alpha_composite(image, layer, x, y)
+
+    if file_name.lower().endswith('.webp'):
+        Image.fromarray(image).save(file_name, quality=90, method=0)
+    else:
+        Image.fromarray(image).save(file_name, compress_level=1)
+    return image
+
+#-----------------------------------------------------------------------------------------------------------
+# Functions for the map elements (shapefile, coastlines, borders, gridlines and labels)
+
+# Default style of the map elements. 'points' is a list of [lon, lat, label, label x offset, label y offset]
+MAP_STYLE = {'shapefile': None,
+             'states': {'edgecolor': 'white', 'linewidth': 0.5},
+             'coastlines': {'color': 'cyan', 'linewidth': 2.0},
+             'borders': {'edgecolor': 'turquoise', 'linewidth': 1.0},
+             'gridlines': {'color': 'white', 'alpha': 0.5, 'linestyle': '--', 'linewidth': 1.0, 'interval': 5, 
+                           'labels': True, 'xpadding': -5, 'ypadding': -15},
+             'points': []}
+
+# Add the map elements to a cartopy axes
+def add_map_elements(ax, style=MAP_STYLE):
+    import cartopy, cartopy.crs as ccrs
+    import matplotlib.patheffects as patheffects
+
+    # Add a shapefile (only the geometries of the map extent, simplified to the axes width)
+    if style.get('shapefile'):
+        x0, x1, y0, y1 = ax.get_extent(ccrs.PlateCarree())
+        shapefile = load_shapefile(style['shapefile'], [x0, y0, x1, y1], pixels=ax.get_window_extent().width)
+        ax.add_geometries(shapefile, ccrs.PlateCarree(), facecolor='none', **style['states'])
+
+    # Add coastlines, borders and gridlines
+    if style.get('coastlines'):
+        ax.coastlines(resolution='10m', **style['coastlines'])
+    if style.get('borders'):
+        ax.add_feature(cartopy.feature.BORDERS, **style['borders'])
+    if style.get('gridlines'):
+        g = style['gridlines']
+        gl = ax.gridlines(crs=ccrs.PlateCarree(), color=g['color'], alpha=g['alpha'], linestyle=g['linestyle'], linewidth=g['linewidth'], 
+                          xlocs=np.arange(-180, 180, g['interval']), ylocs=np.arange(-90, 90, g['interval']), draw_labels=g['labels'])
+        if g['labels']:
+            gl.bottom_labels = False
+            gl.right_labels = False
+            gl.xpadding = g['xpadding']
+            gl.ypadding = g['ypadding']
+
+    # Add the points (a circle and a text)
+    for lon, lat, label, dx, dy in style.get('points', []):
+        ax.plot(lon, lat, 'o', color='red', markersize=5, transform=ccrs.Geodetic(), markeredgewidth=1.0, markeredgecolor=(0, 0, 0, 1))
+        txt = ax.text(lon + dx, lat + dy, label, fontsize='12', fontweight='bold', color='gold', transform=ccrs.Geodetic())
+        txt.set_path_effects([patheffects.withStroke(linewidth=2, foreground='black')])
+
+# Rasterize the map elements of an extent [min lon, min lat, max lon, max lat] into an RGBA uint8 layer
+# with shape (lines, cols), in the PlateCarree projection. The layer is drawn once for each extent, 
+# size and style, stored in 'cache_dir' as a PNG file and cached in memory, so each new frame only
+# has to composite it (see render_frame)
+def map_overlay(extent, shape, style=MAP_STYLE, cache_dir='..//Overlays', dpi=150):
+    import json
+    import hashlib
+    from PIL import Image
+
+    description = json.dumps([list(extent), 'PlateCarree', list(shape), style, dpi], sort_keys=True)
+    key = hashlib.md5(description.encode()).hexdigest()
+    file_name = f'{cache_dir}/overlay_{key}.png'
+
+    if ('overlay', key) in LAYERS:
+        return LAYERS[('overlay', key)]
+
+    if not os.path.exists(file_name):
+        import matplotlib.pyplot as plt
+        import cartopy.crs as ccrs
+
+        print(f'Rasterizing the map overlay {file_name}')
+        os.makedirs(cache_dir, exist_ok=True)
+
+        fig = plt.figure(figsize=(shape[1]/float(dpi), shape[0]/float(dpi)), dpi=dpi)
+        ax = plt.axes([0, 0, 1, 1], projection=ccrs.PlateCarree())
+        ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
+        ax.patch.set_visible(False)
+        ax.spines['geo'].set_visible(False)
+        add_map_elements(ax, style)
+        fig.savefig(file_name, dpi=dpi, transparent=True)
+        plt.close(fig)
+
+    layer = np.asarray(Image.open(file_name).convert('RGBA')).copy()
+    LAYERS[('overlay', key)] = layer
+    return layer
+
+#-----------------------------------------------------------------------------------------------------------
+# Read the geometries of a shapefile for an extent [min lon, min lat, max lon, max lat]
+# The shapefile is read only once per process (and indexed with a STRtree). The geometries that intersect 
+# the extent are clipped (with a margin, so the cuts are out of the map), simplified with 'tolerance' 
+# (in degrees, by default half of the pixel size of an image 'pixels' wide: 3000 for a 10 inch figure saved
+# with 300 dpi) and saved in 'cache_dir' (by default a 'Shapefile_cache' directory next to the shapefile) as 
+# WKB, to be reloaded fast
+SHAPEFILES = {}
+
+def load_shapefile(path, extent=None, pixels=3000, tolerance=None, cache_dir=None, margin=1.0):
+    import pickle
+    import hashlib
+    import shapely
+    import cartopy.io.shapereader as shpreader
+
+    if tolerance is None:
+        tolerance = 0.5 * (extent[2] - extent[0]) / pixels if (extent is not None and pixels) else 0.0
+
+    mtime = os.path.getmtime(path)
+    key = (os.path.abspath(path), mtime, None if extent is None else tuple(extent), tolerance)
+    if key in SHAPEFILES:
+        return SHAPEFILES[key]
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), 'Shapefile_cache')
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_file = f'{cache_dir}/{name}_{hashlib.md5(str(key).encode()).hexdigest()}.wkb'
+
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            geometries = list(shapely.from_wkb(pickle.load(f)))
+    else:
+        # All the geometries of the shapefile and their spatial index
+        if (key[0], mtime) not in SHAPEFILES:
+            all_geometries = np.array(list(shpreader.Reader(path).geometries()), dtype=object)
+            SHAPEFILES[(key[0], mtime)] = (all_geometries, shapely.STRtree(all_geometries))
+        all_geometries, tree = SHAPEFILES[(key[0], mtime)]
+
+        if extent is None:
+            geometries = all_geometries
+        else:
+            region = shapely.box(extent[0] - margin, extent[1] - margin, extent[2] + margin, extent[3] + margin)
+            geometries = shapely.intersection(all_geometries[tree.query(region)], region)
+
+        if tolerance > 0:
+            geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        geometries = [g for g in geometries if not g.is_empty]
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'wb') as f:
+            pickle.dump(list(shapely.to_wkb(np.array(geometries, dtype=object))), f)
+
+    SHAPEFILES[key] = geometries
+    return geometries
+
+#-----------------------------------------------------------------------------------------------------------
+# Persistent figure template for the animation frames (matplotlib renderer)
+
+# Templates already built in this process, by configuration
+FIGURE_TEMPLATES = {}
+
+# Build the figure of the animation frames once. 'config' is a dict with: extent [min lon, min lat, max lon, 
+# max lat], shape (lines, cols) of the data, cpt_file, vmin, vmax, thick_interval, legend_title, style (see 
+# MAP_STYLE) and logo. The static artists (map elements, colorbar, logo, scalebar and north arrow) are drawn 
+# a single time into an RGBA foreground and the background is saved, so for each frame only the image and 
+# the title have to be drawn (like blitting)
+def figure_template(config):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+    from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
+    import matplotlib.font_manager as fm
+    import matplotlib.patheffects as patheffects
+    import matplotlib.image as mpimg
+    import cartopy.crs as ccrs
+
+    extent = config['extent']
+    lines, cols = config['shape']
+    vmin, vmax, thick_interval = config['vmin'], config['vmax'], config['thick_interval']
+
+    # Choose the plot size (width x height, in inches), at 300 dpi
+    fig = Figure(figsize=(cols/150.0, lines/150.0), dpi=300)
+    canvas = FigureCanvasAgg(fig)
+
+    # Use the PlateCarree projection in cartopy
+    ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.PlateCarree())
+    ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
+
+    # The image (the data is updated for each frame)
+    img_extent = [extent[0], extent[2], extent[1], extent[3]]
+    img = ax.imshow(np.full((lines, cols), np.nan, dtype=np.float32), origin='upper', vmin=vmin, vmax=vmax, 
+                    extent=img_extent, cmap=loadCPT_cmap(config['cpt_file']))
+
+    # Colorbar inside the picture
+    axins1 = inset_axes(ax, width="100%", height="1%", loc='lower center', borderpad=0.0)
+    ticks = np.arange(vmin, vmax, thick_interval)
+    ticks = (thick_interval * np.round(ticks / thick_interval))[1:]
+    cb = fig.colorbar(img, cax=axins1, orientation="horizontal", ticks=ticks)
+    cb.set_label(label=config['legend_title'], color='black', size=10, weight='bold')
+    cb.outline.set_visible(False)
+    cb.ax.tick_params(width = 0)
+    cb.ax.xaxis.set_ticks_position('top')
+    cb.ax.xaxis.set_label_position('top')
+    cb.ax.tick_params(axis='x', colors='black', labelsize=int(lines * 0.005))
+
+    # Shapefile, coastlines, borders, gridlines and labels
+    add_map_elements(ax, config['style'])
+
+    # Logo
+    if config.get('logo'):
+        newax = fig.add_axes([0.01, 0.03, 0.10, 0.10], anchor='SW')
+        newax.imshow(mpimg.imread(config['logo']))
+        newax.axis('off')
+
+    # Scalebar and N arrow
+    distance = 1000
+    scalebar = AnchoredSizeBar(ax.transData, (distance / 111), str(distance) + ' km', loc='lower right', pad=0.1, 
+                               borderpad=2.5, color='black', frameon=True, label_top=True, sep=5, size_vertical=0.5, 
+                               fontproperties=fm.FontProperties(size=10))
+    ax.add_artist(scalebar)
+    ax.text(0.91, 0.070, u'▲\nN', transform=ax.transAxes, horizontalalignment='center', verticalalignment='bottom',
+            path_effects=[patheffects.withStroke(linewidth=5, foreground="w")])
+
+    # Title (the text is updated for each frame)
+    title = fig.text(0.01, 0.97, '', fontsize=15, fontweight='bold', color='white', 
+                     bbox=dict(boxstyle="round", fc=(0.0, 0.0, 0.0), ec=(1., 1., 1.)))
+
+    # Draw the static artists (without the figure / axes background, the image and the title) as the foreground
+    img.set_visible(False)
+    title.set_visible(False)
+    fig.patch.set_visible(False)
+    ax.patch.set_visible(False)
+    canvas.draw()
+    foreground = np.asarray(canvas.buffer_rgba()).copy()
+
+    # Draw only the figure / axes background and save it
+    hidden = [a for a in fig.get_children() if a not in (fig.patch, ax)] + [a for a in ax.get_children() if a is not ax.patch]
+    hidden = [a for a in hidden if a.get_visible()]
+    for artist in hidden:
+        artist.set_visible(False)
+    fig.patch.set_visible(True)
+    ax.patch.set_visible(True)
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    for artist in hidden:
+        artist.set_visible(True)
+    img.set_visible(True)
+    title.set_visible(True)
+
+    return {'fig': fig, 'canvas': canvas, 'ax': ax, 'img': img, 'title': title, 'foreground': foreground, 'background': background}
+
+# Render a frame with the template of 'config' (built only in the first call): update the image data and the 
+# title, draw only these two artists over the cached background / foreground and save the image (written to
+# a temporary file and renamed, so a partial image is never seen by the animation)
+def plot_frame(file_name, data, title, config):
+    import json
+    from PIL import Image
+
+    key = json.dumps(config, sort_keys=True)
+    if key not in FIGURE_TEMPLATES:
+        FIGURE_TEMPLATES[key] = figure_template(config)
+    template = FIGURE_TEMPLATES[key]
+
+    canvas = template['canvas']
+    template['img'].set_data(data)
+    template['title'].set_text(title)
+
+    canvas.restore_region(template['background'])
+    template['ax'].draw_artist(template['img'])
+    image = np.asarray(canvas.buffer_rgba())
+    alpha_composite(image, template['foreground'])
+    template['fig'].draw_artist(template['title'])
+
+    Image.fromarray(np.asarray(canvas.buffer_rgba())[..., :3]).save(file_name + '.tmp', format='PNG', compress_level=1)
+    os.replace(file_name + '.tmp', file_name)
+    return file_name
+
+# Pool of processes for the frame rendering (matplotlib is not thread safe). It is created in the first call
+# and kept alive, so each worker builds its figure templates (see plot_frame) only once. The scripts that use 
+# it must run their main code inside "if __name__ == '__main__':" (the workers import the main module)
+RENDER_POOL = {}
+
+def render_pool(max_workers=None):
+    from concurrent.futures import ProcessPoolExecutor
+    if 'executor' not in RENDER_POOL:
+        RENDER_POOL['executor'] = ProcessPoolExecutor(max_workers=max_workers)
+    return RENDER_POOL['executor']
+
+# Wait for the frames in the pool of processes and close it
+def close_render_pool():
+    if 'executor' in RENDER_POOL:
+        RENDER_POOL.pop('executor').shutdown()
+
+# Render a list of frames (file_name, data, title, config) in the pool of processes. The file names are 
+# returned in the order of the frames
+def render_frames(frames, max_workers=None):
+    frames = list(frames)
+    if not frames:
+        return []
+    return list(render_pool(max_workers).map(plot_frame, *zip(*frames)))
+
+#-----------------------------------------------------------------------------------------------------------
+# Functions for the HTML animation (my_animation.html)
+
+# Read the list of frames of the animation in 'outdir': the manifest 'frames.js' has the JSON list of file names
+# (frame_list, read by my_animation.html) and the list of their dates (frame_times), in the same order
+def animation_frames(outdir, manifest='frames.js', times=False):
+    import json
+    lists = {'frame_list': [], 'frame_times': []}
+    if os.path.exists(f'{outdir}/{manifest}'):
+        with open(f'{outdir}/{manifest}') as f:
+            for line in f:
+                if '=' in line:
+                    name, value = line.split('=', 1)
+                    lists[name.strip()] = json.loads(value.strip().rstrip(';'))
+    if not times:
+        return lists['frame_list']
+    return [(datetime.strptime(time, '%Y-%m-%dT%H:%M:%S'), name) for time, name in zip(lists['frame_times'], lists['frame_list'])]
+
+# Write the list of frames of the animation, a list of (date, file name) (to a temporary file, renamed so the 
+# page never reads a partial list)
+def write_animation_frames(outdir, frames, manifest='frames.js'):
+    import json
+    with open(f'{outdir}/{manifest}.tmp', 'w') as f:
+        f.write('frame_list = ' + json.dumps([name for time, name in frames]) + ';\n')
+        f.write('frame_times = ' + json.dumps([time.strftime('%Y-%m-%dT%H:%M:%S') for time, name in frames]) + ';\n')
+    os.replace(f'{outdir}/{manifest}.tmp', f'{outdir}/{manifest}')
+
+# Add a new frame, of the scan 'date', to the animation in 'outdir', keeping the last 'max_files' frames (by 
+# date). Only the new frame is added (hard linked, or copied when the file system does not support links) and
+# only the frames that left the animation are removed, instead of copying all the frames to img_1 ... img_N
+def publish_frame(file_name, date, outdir, max_files=24, manifest='frames.js'):
+    from shutil import copyfile
+
+    frames = animation_frames(outdir, manifest, times=True)
+
+    # Link the new frame (a frame rendered again replaces the old one, unless it is already the same file)
+    name = os.path.basename(file_name)
+    if not (os.path.exists(f'{outdir}/{name}') and os.path.samefile(file_name, f'{outdir}/{name}')):
+        try:
+            os.link(file_name, f'{outdir}/{name}.tmp')
+        except OSError:
+            copyfile(file_name, f'{outdir}/{name}.tmp')
+        os.replace(f'{outdir}/{name}.tmp', f'{outdir}/{name}')
+    frames = sorted([frame for frame in frames if frame[1] != name] + [(date, name)])
+
+    # Remove the frames that left the animation
+    for time, old in frames[:-max_files]:
+        if os.path.exists(f'{outdir}/{old}'):
+            os.remove(f'{outdir}/{old}')
+    frames = frames[-max_files:]
+
+    write_animation_frames(outdir, frames, manifest)
+    return [name for time, name in frames]
+
+# Remove all the frames of the animation in 'outdir'
+def clear_animation(outdir, manifest='frames.js'):
+    for old in animation_frames(outdir, manifest):
+        if os.path.exists(f'{outdir}/{old}'):
+            os.remove(f'{outdir}/{old}')
+    write_animation_frames(outdir, [], manifest)
+
+#-----------------------------------------------------------------------------------------------------------
+# Streaming animation writer: GIF, animated WebP or MP4 (by the extension of the file name). Each frame is 
+# written as soon as it is appended, so only one frame is kept in memory, no matter the number of frames
+
+# Open an animation. 'fps' is the number of frames per second and 'loop' the number of loops (0: forever).
+# GIF: 'palette' is an RGB palette (N <= 256, 3) used by all the frames (e.g. from the color table, see 
+# LUT_palette; by default, the palette of the first frame is reused by the others) and each frame has only
+# the rectangle that changed from the previous one. WebP: 'quality' of each frame. MP4: 'crf' of the H.264 
+# encoder (ffmpeg)
+def open_animation(file_name, fps=1, loop=0, palette=None, quality=90, crf=23):
+    writer = {'file_name': file_name, 'format': os.path.splitext(file_name)[1].lower()[1:], 'fps': fps, 
+              'loop': loop, 'palette': palette, 'quality': quality, 'crf': crf, 'size': None, 'frames': 0,
+              'previous': None}
+    if writer['format'] not in ('gif', 'webp', 'mp4'):
+        raise ValueError(f'Animation format not supported: {file_name}')
+    return writer
+
+# Append a frame (an image file name or an RGB / RGBA uint8 array) to the animation. Frames with a different
+# size are pasted on a white canvas with the size of the first frame
+def append_frame(writer, frame):
+    import io
+    import struct
+    from PIL import Image
+
+    image = Image.open(frame) if isinstance(frame, str) else Image.fromarray(frame)
+    image = image.convert('RGB')
+    if writer['size'] is None:
+        writer['size'] = image.size
+        _start_animation(writer, image)
+    elif image.size != writer['size']:
+        canvas = Image.new('RGB', writer['size'], (255, 255, 255))
+        canvas.paste(image, (0, 0))
+        image = canvas
+    duration = int(round(1000.0 / writer['fps']))
+
+    if writer['format'] == 'gif':
+        from PIL import GifImagePlugin
+
+        # Palette indices of the frame (a lookup in the color cube of the palette, no quantization)
+        rgb = np.asarray(image)
+        indices = writer['cube'][rgb[..., 0] >> 2, rgb[..., 1] >> 2, rgb[..., 2] >> 2]
+
+        # Only the rectangle with the pixels that changed is written, over the previous frame (disposal 1)
+        x0, y0, x1, y1 = 0, 0, indices.shape[1], indices.shape[0]
+        if writer['previous'] is not None:
+            changed = indices != writer['previous']
+            rows = np.flatnonzero(changed.any(axis=1))
+            cols = np.flatnonzero(changed.any(axis=0))
+            if len(rows) == 0:
+                rows = cols = np.array([0])
+            x0, y0, x1, y1 = cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+        writer['previous'] = indices
+
+        rectangle = Image.frombytes('P', (int(x1 - x0), int(y1 - y0)), np.ascontiguousarray(indices[y0:y1, x0:x1]).tobytes())
+        for data in GifImagePlugin.getdata(rectangle, (int(x0), int(y0)), duration=duration, disposal=1):
+            writer['fp'].write(data)
+
+    elif writer['format'] == 'webp':
+        # Encode the frame as a WebP image and copy its bitstream to an ANMF (animation frame) chunk
+        buffer = io.BytesIO()
+        image.save(buffer, format='WEBP', quality=writer['quality'])
+        data = buffer.getvalue()
+        bitstream = b''
+        pos = 12
+        while pos < len(data):
+            size = struct.unpack('<I', data[pos + 4:pos + 8])[0]
+            if data[pos:pos + 4] in (b'ALPH', b'VP8 ', b'VP8L'):
+                bitstream += data[pos:pos + 8 + size + (size & 1)]
+            pos += 8 + size + (size & 1)
+        w, h = image.size
+        header = (struct.pack('<I', 0)[:3] + struct.pack('<I', 0)[:3] + struct.pack('<I', w - 1)[:3] + 
+                  struct.pack('<I', h - 1)[:3] + struct.pack('<I', duration)[:3] + bytes([2]))
+        writer['fp'].write(b'ANMF' + struct.pack('<I', len(header) + len(bitstream)) + header + bitstream)
+
+    elif writer['format'] == 'mp4':
+        writer['process'].stdin.write(image.tobytes())
+
+    writer['frames'] += 1
+
+# Write the header of the animation (when the first frame, with the size of the animation, arrives)
+def _start_animation(writer, image):
+    import struct
+    import subprocess
+
+    w, h = image.size
+    if writer['format'] == 'gif':
+        # Global palette (of the first frame, when not given)
+        if writer['palette'] is None:
+            writer['palette'] = np.array(image.quantize(256).getpalette()[:768], dtype=np.uint8).reshape(-1, 3)
+        colors = np.asarray(writer['palette'], dtype=np.uint8)[:256, :3]
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        palette[:len(colors)] = colors
+
+        # Color cube (64 x 64 x 64) with the index of the nearest palette color of each RGB color
+        levels = np.arange(64, dtype=np.float32) * 4 + 2
+        grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), -1).reshape(-1, 3)
+        colors = colors.astype(np.float32)
+        cube = np.empty(len(grid), dtype=np.uint8)
+        for i in range(0, len(grid), 16384):
+            distance = (colors ** 2).sum(1)[None, :] - 2 * grid[i:i + 16384] @ colors.T
+            cube[i:i + 16384] = distance.argmin(1)
+        writer['cube'] = cube.reshape(64, 64, 64)
+
+        writer['fp'] = open(writer['file_name'], 'wb')
+        writer['fp'].write(b'GIF89a' + struct.pack('<HHBBB', w, h, 0xF7, 0, 0) + palette.tobytes())
+        writer['fp'].write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', writer['loop']) + b'\x00')
+
+    elif writer['format'] == 'webp':
+        # RIFF header (the size is written when closing), canvas (VP8X) and animation (ANIM) chunks
+        writer['fp'] = open(writer['file_name'], 'wb')
+        writer['fp'].write(b'RIFF' + struct.pack('<I', 0) + b'WEBP')
+        writer['fp'].write(b'VP8X' + struct.pack('<I', 10) + bytes([2, 0, 0, 0]) + struct.pack('<I', w - 1)[:3] + struct.pack('<I', h - 1)[:3])
+        writer['fp'].write(b'ANIM' + struct.pack('<I', 6) + bytes([255, 255, 255, 255]) + struct.pack('<H', writer['loop']))
+
+    elif writer['format'] == 'mp4':
+        # The frames are sent to ffmpeg through a pipe (H.264 needs an even width and height)
+        command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}', 
+                   '-r', str(writer['fps']), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', 
+                   '-pix_fmt', 'yuv420p', '-crf', str(writer['crf']), writer['file_name']]
+        writer['process'] = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+# RGB palette (N <= 'colors', 3) for a GIF animation from a lookup table of a color table (see compile_CPT): 
+# the colors of the table (sampled when there are too many) and the 'extra' colors (texts, map elements, ...)
+def LUT_palette(lut, colors=256, extra=((0, 0, 0), (255, 255, 255))):
+    extra = np.asarray(extra, dtype=np.uint8).reshape(-1, 3)
+    table = np.asarray(lut)[:, :3]
+    room = colors - len(extra)
+    if len(table) > room:
+        table = table[np.linspace(0, len(table) - 1, room).round().astype(int)]
+    palette = np.vstack([table, extra])
+    return palette[np.sort(np.unique(palette, axis=0, return_index=True)[1])]
+
+# Finish the animation
+def close_animation(writer):
+    import struct
+    if writer['size'] is None:
+        return
+    if writer['format'] == 'gif':
+        writer['fp'].write(b';')
+        writer['fp'].close()
+    elif writer['format'] == 'webp':
+        size = writer['fp'].tell() - 8
+        writer['fp'].seek(4)
+        writer['fp'].write(struct.pack('<I', size))
+        writer['fp'].close()
+    elif writer['format'] == 'mp4':
+        writer['process'].stdin.close()
+        writer['process'].wait()
+
+#-----------------------------------------------------------------------------------------------------------
+# Times of the new ABI scans, for a resident (service) mode: wait until the next scan (aligned to 'interval' 
+# minutes, the ABI cadence) should be available on the cloud ('latency' minutes after the scan start) and 
+# yield it, forever. The first time is the last scan already available (the Full Disk files usually reach the
+# bucket 11 to 12 minutes after the scan start; see also wait_CMI for the files that arrive later)
+def scan_times(interval=10, latency=15):
+    import time
+    from datetime import timedelta, timezone
+
+    step = timedelta(minutes=interval)
+    now = datetime.now(timezone.utc) - timedelta(minutes=latency)
+    midnight = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+    scan = midnight + step * ((now - midnight) // step)
+    while True:
+        wait = (scan + timedelta(minutes=latency) - datetime.now(timezone.utc)).total_seconds()
+        if wait > 0:
+            time.sleep(wait)
+        # Naive UTC time, as the other dates of the scripts
+        yield scan.replace(tzinfo=None)
+        scan += step
+
+# Download a CMI file that may not be on the cloud yet: try again every 'poll' seconds, for at most 'timeout'
+# minutes. Returns the file name or -1 (as download_CMI) when the file did not arrive
+def wait_CMI(yyyymmddhhmn, band, path_dest, timeout=15, poll=60):
+    import time
+
+    end = time.monotonic() + timeout * 60
+    while True:
+        file_name = download_CMI(yyyymmddhhmn, band, path_dest)
+        if file_name != -1 or time.monotonic() + poll > end:
+            return file_name
+        time.sleep(poll)
+
+#-----------------------------------------------------------------------------------------------------------
+# Functions for the files received by GEONETCast-Americas (FAZZT client, by default in /data/fazzt)
+
+# File name patterns of the products (the named groups are returned with each file)
+FAZZT_PRODUCTS = {'ABI-CMIP': r'^OR_ABI-L2-CMIPF-M\dC(?P<band>\d{2})_G(?P<satellite>\d{2})_s(?P<time>\d{13})\d*_e\d+_c\d+\.nc',
+                  'SST':      r'^OR_ABI-L2-SSTF-M\d_G(?P<satellite>\d{2})_s(?P<time>\d{13})\d*_e\d+_c\d+\.nc',
+                  'RRQPE':    r'^OR_ABI-L2-RRQPEF-M\d_G(?P<satellite>\d{2})_s(?P<time>\d{13})\d*_e\d+_c\d+\.nc',
+                  'GLM':      r'^OR_GLM-L2-LCFA_G(?P<satellite>\d{2})_s(?P<time>\d{13})\d*_e\d+_c\d+\.nc',
+                  'GFS':      r'^gfs\.t(?P<run>\d{2})z\.pgrb2\w*\.(?P<resolution>\dp\d{2})\.f(?P<hour>\d{3})$',
+                  'CRW':      r'^(?P<product>coraltemp|ct5km_[\w-]+?)_v[\d.]+_(?P<date>\d{8})\.nc',
+                  'BHP-TPW':  r'^BHP-TPW_v\d+r\d+_blend_s(?P<time>\d{14})\d*_e\d+_c\d+\.nc'}
+
+# New files in the 'directories' (and sub directories) with inotify (Linux): a file is returned when it is 
+# closed after written or moved to the directory
+def _inotify_files(directories):
+    import ctypes
+    import ctypes.util
+    import struct
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    fd = libc.inotify_init()
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init failed')
+
+    IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_ISDIR = 0x8, 0x80, 0x100, 0x40000000
+    watches = {}
+    def add_watch(directory):
+        for root, dirs, files in os.walk(directory):
+            wd = libc.inotify_add_watch(fd, os.fsencode(root), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed: {root}')
+            watches[wd] = root
+    for directory in directories:
+        add_watch(directory)
+
+    def events():
+        while True:
+            data = os.read(fd, 65536)
+            pos = 0
+            while pos < len(data):
+                wd, mask, cookie, length = struct.unpack_from('iIII', data, pos)
+                name = data[pos + 16:pos + 16 + length].rstrip(b'\0').decode()
+                pos += 16 + length
+                path = os.path.join(watches.get(wd, ''), name)
+                if mask & IN_ISDIR:
+                    # New sub directory: watch it (and return the files already in it)
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        add_watch(path)
+                        for root, dirs, files in os.walk(path):
+                            for file in files:
+                                yield os.path.join(root, file)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    yield path
+    return events()
+
+# New files in the 'directories' (and sub directories), listing them every 'interval' seconds: a file is 
+# returned when its size and modification time did not change since the previous listing
+def _poll_files(directories, interval=5):
+    import time
+
+    def listing():
+        files = {}
+        for directory in directories:
+            for root, dirs, names in os.walk(directory):
+                for name in names:
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                        files[os.path.join(root, name)] = (stat.st_size, stat.st_mtime)
+                    except OSError:
+                        pass
+        return files
+
+    seen = set(listing())
+    previous = {}
+    while True:
+        time.sleep(interval)
+        current = listing()
+        for path, state in current.items():
+            if path not in seen and previous.get(path) == state:
+                seen.add(path)
+                yield path
+        previous = current
+
+# Watch the 'directories' and yield (product, fields, path) for each new file that matches a product 
+# pattern ('fields' is a dict with the named groups of the pattern). It uses inotify when available 
+# (the files are processed as soon as they arrive) and lists the directories every 'interval' seconds otherwise
+def watch_files(directories, patterns=FAZZT_PRODUCTS, interval=5):
+    import re
+
+    patterns = {product: re.compile(pattern) for product, pattern in patterns.items()}
+    try:
+        files = _inotify_files(directories)
+    except (OSError, AttributeError, TypeError):
+        print('inotify not available, checking the directories every', interval, 'seconds')
+        files = _poll_files(directories, interval)
+
+    for path in files:
+        name = os.path.basename(path)
+        for product, pattern in patterns.items():
+            match = pattern.search(name)
+            if match:
+                yield product, match.groupdict(), path
+                break
+
+# Scans of an ABI band received by GEONETCast-Americas: each new Full Disk file of the band is linked (or 
+# copied, when the file system does not support links) to 'path_dest' and its scan time is yielded
+def received_scans(directories, band, path_dest, interval=5):
+    from shutil import copyfile
+
+    os.makedirs(path_dest, exist_ok=True)
+    for product, fields, path in watch_files(directories, {'ABI-CMIP': FAZZT_PRODUCTS['ABI-CMIP']}, interval):
+        if int(fields['band']) != int(band):
+            continue
+        dst = f'{path_dest}/{os.path.basename(path)}'
+        if not os.path.exists(dst):
+            try:
+                os.link(path, dst)
+            except OSError:
+                copyfile(path, dst)
+        yield datetime.strptime(fields['time'], '%Y%j%H%M%S')
@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime              # Basic Dates and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import numpy as np                         # Import the Numpy packag
+from utilities import make_RGB             # Our function to create RGBs
 #-----------------------------------------------------------------------------------------------------------
 # Open the GOES-R image
 # Download files at this link: http://home.chpc.utah.edu/~u0553130/Brian_Blaylock/cgi-bin/goes16_download.cgi
@@ -30,44 +31,9 @@ data4 = file4.variables['CMI'][:,:][::4 ,::4] - 273.15
 #-----------------------------------------------------------------------------------------------------------
 # RGB Quick Guide: http://rammb.cira.colostate.edu/training/visit/quick_guides/QuickGuide_GOESR_AirMassRGB_final.pdf 
 
-# RGB Components
-R = data1 - data2
-G = data3 - data4
-B = data1
- 
-# Minimuns, Maximuns and Gamma
-Rmin = -26.2
-Rmax = 0.6
-
-Gmin = -43.2
-Gmax = 6.7
-
-Bmin = -64.65
-Bmax = -29.25
-
-R[R > Rmax] = Rmax
-R[R < Rmin] = Rmin
-
-G[G > Gmax] = Gmax
-G[G < Gmin] = Gmin
-
-B[B > Bmax] = Bmax
-B[B < Bmin] = Bmin 
-
-gamma_R = 1
-gamma_G = 1
-gamma_B = 1
- 
-# Normalize the data
-R = ((R - Rmin) / (Rmax - Rmin)) ** (1/gamma_R)
-G = ((G - Gmin) / (Gmax - Gmin)) ** (1/gamma_G)
-B = ((B - Bmin) / (Bmax - Bmin)) ** (1/gamma_B) 
-
-# Invert the "Blue" component
-B = 1.0 - B
-
-# Create the RGB
-RGB = np.stack([R, G, B], axis=2)
+# Create the RGB (the Airmass recipe, with the minimums, maximums and gamma of each component, is in utilities.py)
+# (as 8 bit components, ready to be plotted)
+RGB = make_RGB('airmass', {8: data1, 10: data2, 12: data3, 13: data4}, dtype=np.uint8)
 #-----------------------------------------------------------------------------------------------------------
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(7,7)) 
@@ -8,7 +8,9 @@ import cartopy, cartopy.crs as ccrs      # Plot maps
 import numpy as np                       # Scientific computing with Python
 import os                                # Miscellaneous operating system interfaces
 from utilities import download_CMI       # Our own utilities
-from utilities import geo2grid, convertExtent2GOESProjection      # Our own utilities
+from utilities import convertExtent2GOESProjection      # Our own utilities
+from utilities import read_band_window                  # Our own utilities
+from utilities import make_RGB                          # Our own utilities
 #-----------------------------------------------------------------------------------------------------------
 # Input and output directories
 input = "Samples"; os.makedirs(input, exist_ok=True)
@@ -35,77 +37,21 @@ file_ch13 = Dataset(f'{input}/{file_ch13}.nc')
 file_ch02 = Dataset(f'{input}/{file_ch02}.nc')
 file_ch05 = Dataset(f'{input}/{file_ch05}.nc')
 #-----------------------------------------------------------------------------------------------------------                   
-# Convert lat/lon to grid-coordinates
-lly, llx = geo2grid(extent[1], extent[0], file_ch13)
-ury, urx = geo2grid(extent[3], extent[2], file_ch13)
+# Get the pixel values of the extent on the band 13 grid (2 km)
+data_ch13 = read_band_window(file_ch13, extent, file_ch13) - 273.15  
 
-# Get the pixel values
-data_ch13 = file_ch13.variables['CMI'][ury:lly, llx:urx] - 273.15  
-#-----------------------------------------------------------------------------------------------------------
-# Convert lat/lon to grid-coordinates
-lly, llx = geo2grid(extent[1], extent[0], file_ch02)
-ury, urx = geo2grid(extent[3], extent[2], file_ch02)
-
-# Get the pixel values
-data_ch02 = file_ch02.variables['CMI'][ury:lly, llx:urx][::4 ,::4] 
-#-----------------------------------------------------------------------------------------------------------
-# Convert lat/lon to grid-coordinates
-lly, llx = geo2grid(extent[1], extent[0], file_ch05)
-ury, urx = geo2grid(extent[3], extent[2], file_ch05)
-
-# Get the pixel values
-data_ch05 = file_ch05.variables['CMI'][ury:lly, llx:urx][::2 ,::2] 
-#-----------------------------------------------------------------------------------------------------------
-# Make the arrays equal size
-cordX = np.shape(data_ch02)[0], np.shape(data_ch05)[0], np.shape(data_ch13)[0]
-cordY = np.shape(data_ch02)[1], np.shape(data_ch05)[1], np.shape(data_ch13)[1]
-
-minvalX = np.array(cordX).min()
-minvalY = np.array(cordY).min()
-
-data_ch02 = data_ch02[0:minvalX, 0:minvalY]
-data_ch05 = data_ch05[0:minvalX, 0:minvalY]
-data_ch13 = data_ch13[0:minvalX, 0:minvalY]
+# Band 2 (0.5 km) and band 5 (1 km) are block-averaged to the band 13 grid
+data_ch02 = read_band_window(file_ch02, extent, file_ch13)
+data_ch05 = read_band_window(file_ch05, extent, file_ch13)
 #-----------------------------------------------------------------------------------------------------------
 # Compute data-extent in GOES projection-coordinates
 img_extent = convertExtent2GOESProjection(extent)              
 #-----------------------------------------------------------------------------------------------------------
 # RGB Quick Guide: http://rammb.cira.colostate.edu/training/visit/quick_guides/QuickGuide_DayCloudConvectionRGB_final.pdf 
 
-# RGB Components
-R = data_ch13
-G = data_ch02
-B = data_ch05
-
-# Minimuns and Maximuns
-Rmin = -53.5
-Rmax = 7.5
-
-Gmin = 0.0
-Gmax = 0.78
-
-Bmin = 0.01
-Bmax = 0.59
-
-R[R<Rmin] = Rmin
-R[R>Rmax] = Rmax
-
-G[G<Gmin] = Gmin
-G[G>Gmax] = Gmax
-
-B[B<Bmin] = Bmin
-B[B>Bmax] = Bmax
-
-# Choose the gamma
-gamma = 1
-
-# Normalize the data
-R = ((R - Rmax) / (Rmin - Rmax)) ** (1/gamma)
-G = ((G - Gmin) / (Gmax - Gmin)) ** (1/gamma)
-B = ((B - Bmin) / (Bmax - Bmin)) ** (1/gamma) 
-
-# Create the RGB
-RGB = np.stack([R, G, B], axis=2)
+# Create the RGB (the Day Cloud Phase recipe, with the minimums, maximums and gamma of each component, is in utilities.py)
+# (as 8 bit components, ready to be plotted)
+RGB = make_RGB('day_cloud_phase', {13: data_ch13, 2: data_ch02, 5: data_ch05}, dtype=np.uint8)
 #-----------------------------------------------------------------------------------------------------------
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(10,6))
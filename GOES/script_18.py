@@ -10,7 +10,11 @@ import os                                           # Miscellaneous operating sy
 from osgeo import gdal                              # Python bindings for GDAL
 import numpy as np                                  # Scientific computing with Python
 from matplotlib import cm                           # Colormap handling utilities
-from utilities import download_CMI, download_GLM    # Our function for download
+from utilities import download_CMI                  # Our function for download
+from utilities import download_GLM_range            # Our function for download
+from utilities import GLM_store_names               # Our function for the GLM store
+from utilities import GLM_store_add                 # Our function for the GLM store
+from utilities import GLM_store_query               # Our function for the GLM store
 from utilities import reproject                     # Our function for reproject
 gdal.PushErrorHandler('CPLQuietErrorHandler')       # Ignore GDAL warnings
 #-----------------------------------------------------------------------------------------------------------
@@ -70,11 +74,6 @@ file = Dataset(filename_ret)
 data = file.variables['Band1'][:]
 #-----------------------------------------------------------------------------------------------------------
 # Get the GLM Data
-
-# Initialize arrays for latitude, longitude, and event energy
-lats = np.array([])
-lons = np.array([])
-energies = np.array([])
 #-----------------------------------------------------------------------------------------------------------
 # Initial time and date
 yyyy = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M').strftime('%Y')
@@ -86,30 +85,25 @@ mn = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M').strftime('%M')
 date_ini = str(datetime(int(yyyy),int(mm),int(dd),int(hh),int(mn)) - timedelta(minutes=10))
 date_end = str(datetime(int(yyyy),int(mm),int(dd),int(hh),int(mn)))
 
-# GLM accumulation loop
-while (date_ini <= date_end):
- 
-    # Date structure
-    yyyymmddhhmnss = datetime.strptime(date_ini, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d%H%M%S')
-
-    # Download the file
-    file_glm = download_GLM(yyyymmddhhmnss, input)
-
-    # Read the file
-    glm = Dataset(f'{input}/{file_glm}.nc')
-
-    # Append lats / longs / event energies
-    lats = np.append(lats, glm.variables['event_lat'][:])
-    lons = np.append(lons, glm.variables['event_lon'][:])
-    energies = np.append(energies, glm.variables['event_energy'][:])
-    
-    # Increment the date_ini
-    date_ini = str(datetime.strptime(date_ini, '%Y-%m-%d %H:%M:%S') + timedelta(seconds=20))
+# GLM events store (events of the files already processed are read from it, instead of the NetCDF files)
+store = "GLM_Store"
+
+# Download the GLM files of the interval that are not in the store yet (one listing per hour, concurrent downloads)
+yyyymmddhhmnss_ini = datetime.strptime(date_ini, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d%H%M%S')
+yyyymmddhhmnss_end = datetime.strptime(date_end, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d%H%M%S')
+files_glm = download_GLM_range(yyyymmddhhmnss_ini, yyyymmddhhmnss_end, input, exclude=GLM_store_names(store, yyyymmddhhmnss_ini, yyyymmddhhmnss_end))
+
+# Add the new files to the store
+for file_glm in files_glm:
+    GLM_store_add(store, f'{input}/{file_glm}.nc')
+
+# Read the events inside the extent
+lats, lons, energies = GLM_store_query(store, extent, yyyymmddhhmnss_ini, yyyymmddhhmnss_end)
 #-----------------------------------------------------------------------------------------------------------
 # Stack and transpose the lat lons
 values = np.vstack((lats, lons)).T
 
-# Get the counts
+# Get the counts (the events of the same GLM pixel have the same lat / lon)
 points, counts = np.unique(values, axis=0, return_counts=True)
 
 # Get the counts indices
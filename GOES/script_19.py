@@ -10,8 +10,14 @@ import os                                             # Miscellaneous operating
 from osgeo import gdal                                # Python bindings for GDAL
 import numpy as np                                    # Scientific computing with Python
 from matplotlib import cm                             # Colormap handling utilities
-from utilities import download_CMI, download_GLM      # Our function for download
+from utilities import download_CMI                    # Our function for download
+from utilities import download_GLM_range              # Our function for download
+from utilities import GLM_store_names                 # Our function for the GLM store
+from utilities import GLM_store_add                   # Our function for the GLM store
+from utilities import GLM_store_query                 # Our function for the GLM store
 from utilities import reproject                       # Our function for reproject
+from utilities import GLM_grid                        # Our function for the GLM density
+from utilities import GLM_density                     # Our function for the GLM density
 from scipy.ndimage.filters import gaussian_filter     # To make a heatmap
 gdal.PushErrorHandler('CPLQuietErrorHandler')         # Ignore GDAL warnings
 #-----------------------------------------------------------------------------------------------------------
@@ -77,9 +83,8 @@ data = file.variables['Band1'][:]
 #-----------------------------------------------------------------------------------------------------------
 # Get the GLM Data
 
-# Initialize arrays for latitude, longitude, and event energy
-lats = np.array([])
-lons = np.array([])
+# Create a 120 x 120 grid for the extent (0.5° x 0.33° cells, the density scale below is for this size)
+grid = GLM_grid(extent, ((lonf - loni) / 120, (latf - lati) / 120))
 #-----------------------------------------------------------------------------------------------------------
 # Initial time and date
 yyyy = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M').strftime('%Y')
@@ -91,33 +96,23 @@ mn = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M').strftime('%M')
 date_ini = str(datetime(int(yyyy),int(mm),int(dd),int(hh),int(mn)) - timedelta(minutes=10))
 date_end = str(datetime(int(yyyy),int(mm),int(dd),int(hh),int(mn)))
 
-# GLM accumulation loop
-while (date_ini <= date_end):
- 
-    # Date structure
-    yyyymmddhhmnss = datetime.strptime(date_ini, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d%H%M%S')
+# GLM events store (events of the files already processed are read from it, instead of the NetCDF files)
+store = "GLM_Store"
 
-    # Download the file
-    file_glm = download_GLM(yyyymmddhhmnss, input)
+# Download the GLM files of the interval that are not in the store yet (one listing per hour, concurrent downloads)
+yyyymmddhhmnss_ini = datetime.strptime(date_ini, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d%H%M%S')
+yyyymmddhhmnss_end = datetime.strptime(date_end, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d%H%M%S')
+files_glm = download_GLM_range(yyyymmddhhmnss_ini, yyyymmddhhmnss_end, input, exclude=GLM_store_names(store, yyyymmddhhmnss_ini, yyyymmddhhmnss_end))
 
-    # Read the file
-    glm = Dataset(f'{input}/{file_glm}.nc')
+# Add the new files to the store
+for file_glm in files_glm:
+    GLM_store_add(store, f'{input}/{file_glm}.nc')
 
-    # Append lats / longs / event energies
-    lats = np.append(lats, glm.variables['event_lat'][:])
-    lons = np.append(lons, glm.variables['event_lon'][:])
-    
-    # Increment the date_ini
-    date_ini = str(datetime.strptime(date_ini, '%Y-%m-%d %H:%M:%S') + timedelta(seconds=20))
+# Read the events inside the extent and add them to the grid
+lats, lons, energies = GLM_store_query(store, extent, yyyymmddhhmnss_ini, yyyymmddhhmnss_end)
+heatmap = GLM_density(grid, lats, lons)
 #-----------------------------------------------------------------------------------------------------------
-# Stack and transpose the lat lons
-values = np.vstack((lons,lats)).T
-
-values = values[(values[:,0] >= loni) & (values[:,0] <= lonf)]
-values = values[(values[:,1] >= lati) & (values[:,1] <= latf)]
-
-from scipy.ndimage.filters import gaussian_filter
-heatmap, x, y = np.histogram2d(values[:,0], values[:,1], bins=(120,120), range=[[loni,lonf],[lati,latf]])
+# Smooth the accumulated counts
 heatmap = gaussian_filter(heatmap,1)
 
 print(heatmap.min(), heatmap.max(), heatmap.shape)
@@ -139,7 +134,7 @@ img_extent = [extent[0], extent[2], extent[1], extent[3]]
 img = ax.imshow(data, vmin=-50, vmax=80, cmap='gray_r', origin='upper', extent=img_extent)
 
 # Plot the GLM Data
-glm = ax.imshow(heatmap.T, vmin=0, vmax=600, origin="lower", cmap="hot", interpolation="nearest", extent=img_extent, alpha=0.6)
+glm = ax.imshow(heatmap, vmin=0, vmax=600, origin="upper", cmap="hot", interpolation="nearest", extent=img_extent, alpha=0.6)
 
 # Add coastlines, borders and gridlines
 ax.coastlines(resolution='10m', color='white', linewidth=0.8, zorder=3)
@@ -3,7 +3,6 @@
 # Required modules
 import os                                # Miscellaneous operating system interfaces
 import numpy as np                       # Import the Numpy package
-import colorsys                          # To make convertion of colormaps
 import boto3                             # Amazon Web Services (AWS) SDK for Python
 from botocore import UNSIGNED            # boto3 config
 from botocore.config import Config       # boto3 config
@@ -31,47 +30,48 @@ def loadCPT(path):
 
     f.close()
 
-    x = np.array([])
-    r = np.array([])
-    g = np.array([])
-    b = np.array([])
+    x = []
+    colors = []
+
+    # Background (B), foreground (F) and NaN (N) colors
+    special = {}
 
     colorModel = 'RGB'
 
     for l in lines:
         ls = l.split()
+        if len(ls) == 0:
+            continue
         if l[0] == '#':
             if ls[-1] == 'HSV':
                 colorModel = 'HSV'
-                continue
-            else:
-                continue
+            continue
         if ls[0] == 'B' or ls[0] == 'F' or ls[0] == 'N':
-            pass
+            try:
+                special[ls[0]] = [float(v) for v in ls[1:4]]
+            except ValueError:
+                pass
         else:
-            x=np.append(x,float(ls[0]))
-            r=np.append(r,float(ls[1]))
-            g=np.append(g,float(ls[2]))
-            b=np.append(b,float(ls[3]))
-            xtemp = float(ls[4])
-            rtemp = float(ls[5])
-            gtemp = float(ls[6])
-            btemp = float(ls[7])
-
-        x=np.append(x,xtemp)
-        r=np.append(r,rtemp)
-        g=np.append(g,gtemp)
-        b=np.append(b,btemp)
+            x.append(float(ls[0]))
+            colors.append([float(v) for v in ls[1:4]])
+            x.append(float(ls[4]))
+            colors.append([float(v) for v in ls[5:8]])
+
+    # Convert all the colors (stops and B / F / N) to RGB (0 - 1) at once
+    keys = [k for k in ['B', 'F', 'N'] if len(special.get(k, [])) == 3]
+    colors = np.array(colors + [special[k] for k in keys], dtype=float).reshape(-1, 3)
 
     if colorModel == 'HSV':
-        for i in range(r.shape[0]):
-            rr, gg, bb = colorsys.hsv_to_rgb(r[i]/360.,g[i],b[i])
-        r[i] = rr ; g[i] = gg ; b[i] = bb
+        colors = hsv2rgb(colors[:, 0]/360., colors[:, 1], colors[:, 2])
 
     if colorModel == 'RGB':
-        r = r/255.0
-        g = g/255.0
-        b = b/255.0
+        colors = colors/255.0
+
+    x = np.array(x)
+    r = colors[:len(x), 0]
+    g = colors[:len(x), 1]
+    b = colors[:len(x), 2]
+    special = dict(zip(keys, colors[len(x):].tolist()))
 
     xNorm = (x - x[0])/(x[-1] - x[0])
 
@@ -86,7 +86,131 @@ def loadCPT(path):
 
     colorDict = {'red': red, 'green': green, 'blue': blue}
 
+    # Under / over / bad colors from the B / F / N entries (ignored by LinearSegmentedColormap, see loadCPT_cmap)
+    for k, name in [('B', 'under'), ('F', 'over'), ('N', 'bad')]:
+        if k in special:
+            colorDict[name] = special[k]
+
     return colorDict
+
+# Vectorized HSV to RGB conversion (hue, saturation and value from 0 to 1), returns a (n, 3) array
+def hsv2rgb(h, s, v):
+    h = np.asarray(h, dtype=float)
+    s = np.asarray(s, dtype=float)
+    v = np.asarray(v, dtype=float)
+    i = np.floor(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(int) % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=1)
+
+# Load a CPT file as a matplotlib colormap (cached in memory, keyed by the CPT modification time). With 
+# 'special', the B / F / N entries are the under / over / bad colors; by default, the values out of the range
+# have the colors of the ends of the table and the NaNs are transparent
+CPT_CMAPS = {}
+
+def loadCPT_cmap(path, name='cpt', special=False):
+    from matplotlib.colors import LinearSegmentedColormap
+
+    key = (os.path.abspath(path), name, special, os.path.getmtime(path) if os.path.exists(path) else None)
+    if key in CPT_CMAPS:
+        return CPT_CMAPS[key]
+
+    cpt = loadCPT(path)
+    if cpt is None:
+        return None
+
+    cmap = LinearSegmentedColormap(name, cpt)
+    if special:
+        for color, set_color in [('under', cmap.set_under), ('over', cmap.set_over), ('bad', cmap.set_bad)]:
+            if color in cpt:
+                set_color(cpt[color])
+    CPT_CMAPS[key] = cmap
+    return cmap
+
+#-----------------------------------------------------------------------------------------------------------
+# Compile a CPT file into a lookup table (LUT): a (n + 3, 4) uint8 RGBA array with n colors, followed by
+# the under (n), over (n + 1) and bad / NaN (n + 2) colors: the ends of the table and transparent or, with
+# 'special', the B / F / N entries of the CPT. The LUT is cached in memory and on disk (cache_dir, by default
+# a 'LUT_cache' directory next to the CPT file), keyed by the CPT modification time
+CPT_LUTS = {}
+
+def compile_CPT(path, n=256, cache_dir=None, special=False):
+
+    mtime = os.path.getmtime(path)
+    key = (os.path.abspath(path), n, special, mtime)
+    if key in CPT_LUTS:
+        return CPT_LUTS[key]
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), 'LUT_cache')
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_file = f'{cache_dir}/{name}_{n}{"_special" if special else ""}_{int(mtime * 1e6)}.npy'
+
+    if os.path.exists(cache_file):
+        lut = np.load(cache_file)
+    else:
+        # Interpolate the CPT colors for n equally spaced values
+        cpt = loadCPT(path)
+        if cpt is None:
+            return None
+        xNorm = np.array([s[0] for s in cpt['red']])
+        values = (np.arange(n) + 0.5) / n
+        lut = np.zeros((n + 3, 4), dtype=np.uint8)
+        for i, color in enumerate(['red', 'green', 'blue']):
+            lut[:n, i] = np.rint(255 * np.interp(values, xNorm, [s[1] for s in cpt[color]]))
+        lut[:n, 3] = 255
+        # Under, over and bad colors (from the B / F / N entries of the CPT, when asked and available)
+        lut[n] = lut[0]
+        lut[n + 1] = lut[n - 1]
+        lut[n + 2] = (0, 0, 0, 0)
+        for name, row in [('under', n), ('over', n + 1), ('bad', n + 2)]:
+            if special and name in cpt:
+                lut[row, :3] = np.rint(255 * np.array(cpt[name]))
+                lut[row, 3] = 255
+
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_file, lut)
+
+    CPT_LUTS[key] = lut
+    return lut
+
+# Apply a LUT (see compile_CPT) to an array, returning a (lines, cols, 4) uint8 RGBA image.
+# Values are scaled between vmin and vmax into the LUT indices, so coloring is a single gather.
+def apply_LUT(data, lut, vmin, vmax):
+
+    n = lut.shape[0] - 3
+
+    scaled = np.ma.filled(np.ma.asarray(data, dtype=np.float32), np.nan) - np.float32(vmin)
+    np.multiply(scaled, np.float32(n / (vmax - vmin)), out=scaled)
+
+    bad = np.isnan(scaled)
+    under = scaled < 0
+    over = scaled > n
+    np.clip(scaled, 0, n - 1, out=scaled)
+    scaled[bad] = 0
+
+    index = scaled.astype(np.intp)
+    index[under] = n
+    index[over] = n + 1
+    index[bad] = n + 2
+
+    return lut[index]
+#-----------------------------------------------------------------------------------------------------------
+# S3 client for the AMAZON repositories (anonymous access). It is created only once per process and shared 
+# by the download functions (the client is thread safe)
+S3_CLIENTS = {}
+
+def get_s3_client():
+    if 's3' not in S3_CLIENTS:
+        S3_CLIENTS['s3'] = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+    return S3_CLIENTS['s3']
+
 #-----------------------------------------------------------------------------------------------------------
 def download_CMI(yyyymmddhhmn, band, path_dest):
 
@@ -103,7 +227,7 @@ def download_CMI(yyyymmddhhmn, band, path_dest):
   product_name = 'ABI-L2-CMIPF'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6C{int(band):02.0f}_G16_s{year}{day_of_year}{hour}{min}'
@@ -147,7 +271,7 @@ def download_PROD(yyyymmddhhmn, product_name, path_dest):
   bucket_name = 'noaa-goes16'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6_G16_s{year}{day_of_year}{hour}{min}'
@@ -192,7 +316,7 @@ def download_GLM(yyyymmddhhmnss, path_dest):
   bucket_name = 'noaa-goes16'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   product_name = "GLM-L2-LCFA"
@@ -222,6 +346,66 @@ def download_GLM(yyyymmddhhmnss, path_dest):
         s3_client.download_file(bucket_name, key, f'{path_dest}/{file_name}.nc')
   return f'{file_name}'
 
+#-----------------------------------------------------------------------------------------------------------
+# Files whose names are in 'exclude' (e.g. the granules already in the GLM store) are not downloaded
+def download_GLM_range(yyyymmddhhmnss_ini, yyyymmddhhmnss_end, path_dest, max_workers=8, exclude=()):
+
+  from datetime import timedelta
+  from concurrent.futures import ThreadPoolExecutor
+
+  os.makedirs(path_dest, exist_ok=True)
+
+  date_ini = datetime.strptime(yyyymmddhhmnss_ini, '%Y%m%d%H%M%S')
+  date_end = datetime.strptime(yyyymmddhhmnss_end, '%Y%m%d%H%M%S')
+
+  # AMAZON repository information 
+  # https://noaa-goes16.s3.amazonaws.com/index.html
+  bucket_name = 'noaa-goes16'
+  product_name = "GLM-L2-LCFA"
+
+  # Initializes the S3 client
+  s3_client = get_s3_client()
+  paginator = s3_client.get_paginator('list_objects_v2')
+  #-----------------------------------------------------------------------------------------------------------
+  # List each hour directory of the interval only once and keep the granules that overlap it
+  # (the previous hour too, for a granule that starts before the hour of date_ini and ends after it)
+  keys = []
+  hour = date_ini.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+  while (hour <= date_end):
+    prefix = f'{product_name}/{hour.strftime("%Y")}/{hour.strftime("%j")}/{hour.strftime("%H")}/'
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter = "/"):
+      for obj in page.get('Contents', []):
+        key = obj['Key']
+        # File name: OR_GLM-L2-LCFA_G16_sYYYYJJJHHMMSSs_eYYYYJJJHHMMSSs_cYYYYJJJHHMMSSs.nc
+        parts = key.split('/')[-1].split('_')
+        start = datetime.strptime(parts[3][1:14], '%Y%j%H%M%S')
+        end = datetime.strptime(parts[4][1:14], '%Y%j%H%M%S')
+        if (start <= date_end) and (end > date_ini) and (key.split('/')[-1].split('.')[0] not in exclude):
+          keys.append(key)
+    hour = hour + timedelta(hours=1)
+
+  #-----------------------------------------------------------------------------------------------------------
+  # Check if there are files available
+  if len(keys) == 0:
+    # There are no files
+    print(f'No files found for the interval: {yyyymmddhhmnss_ini} - {yyyymmddhhmnss_end}, Product-{product_name}')
+    return []
+
+  # Download the files concurrently
+  def download(key):
+    file_name = key.split('/')[-1].split('.')[0]
+    if os.path.exists(f'{path_dest}/{file_name}.nc'):
+      print(f'File {path_dest}/{file_name}.nc exists')
+    else:
+      print(f'Downloading file {path_dest}/{file_name}.nc')
+      s3_client.download_file(bucket_name, key, f'{path_dest}/{file_name}.nc')
+    return file_name
+
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    file_names = list(executor.map(download, sorted(keys)))
+
+  return file_names
+
 #-----------------------------------------------------------------------------------------------------------
 # Functions to convert lat / lon extent to array indices 
 def geo2grid(lat, lon, nc):
@@ -312,3 +496,393 @@ def reproject(file_name, ncfile, array, extent, undef):
     # Write the reprojected file on disk
     gdal.Warp(file_name, raw, **kwargs)
 
+
+#-----------------------------------------------------------------------------------------------------------
+# Vectorized version of latlon2xy (works on numpy arrays of lats / lons)
+def latlon2xy_array(lat, lon):
+    # GOES-16 fixed grid constants (see latlon2xy)
+    req = 6378137
+    rpol = 6356752.31414
+    e = 0.0818191910435
+    H = 42164160
+    lambda0 = -1.308996939
+
+    # Convert to radians
+    latRad = np.radians(lat)
+    lonRad = np.radians(lon)
+
+    # Geocentric latitude and distance to the point on the ellipsoid
+    Phi_c = np.arctan(((rpol * rpol)/(req * req)) * np.tan(latRad))
+    rc = rpol/(np.sqrt(1 - ((e * e) * (np.cos(Phi_c) * np.cos(Phi_c)))))
+
+    # Satellite to point vector
+    sx = H - (rc * np.cos(Phi_c) * np.cos(lonRad - lambda0))
+    sy = -rc * np.cos(Phi_c) * np.sin(lonRad - lambda0)
+    sz = rc * np.sin(Phi_c)
+
+    # x,y
+    x = np.arcsin((-sy)/np.sqrt((sx*sx) + (sy*sy) + (sz*sz)))
+    y = np.arctan(sz/sx)
+
+    return x, y
+
+#-----------------------------------------------------------------------------------------------------------
+# Functions to create GLM density grids
+
+# Define a regular grid for the GLM density
+# extent: [min lon, min lat, max lon, max lat]
+# resolution: degrees for the 'latlon' projection, radians for the 'goes' (ABI fixed grid) projection
+# (56e-6 rad is the ABI 2 km grid, 28e-6 rad the 1 km grid), or a (x, y) pair for different column / row sizes
+def GLM_grid(extent, resolution, projection='latlon'):
+
+    if projection == 'latlon':
+        xmin, xmax = extent[0], extent[2]
+        ymin, ymax = extent[1], extent[3]
+    elif projection == 'goes':
+        # Scan angles of the extent corners
+        xmin, ymin = latlon2xy(extent[1], extent[0])
+        xmax, ymax = latlon2xy(extent[3], extent[2])
+    else:
+        print(f'Projection {projection} not supported')
+        return None
+
+    xres, yres = resolution if np.ndim(resolution) else (resolution, resolution)
+    nx = int(round((xmax - xmin) / xres))
+    ny = int(round((ymax - ymin) / yres))
+
+    return {'projection': projection, 'extent': extent, 'resolution': resolution, 'xres': xres, 'yres': yres,
+            'xmin': xmin, 'xmax': xmax, 'ymin': ymin, 'ymax': ymax, 'nx': nx, 'ny': ny}
+
+# Map lats / lons to the flat bin indices of the grid (row 0 is the northernmost row)
+# Points outside the grid get the index -1 (points on the max edges are in the last bins, as in np.histogram2d)
+def GLM_grid_index(grid, lats, lons):
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+
+    if grid['projection'] == 'goes':
+        x, y = latlon2xy_array(lats, lons)
+    else:
+        x, y = lons, lats
+
+    col = np.floor((x - grid['xmin']) / grid['xres'])
+    lin = np.floor((grid['ymax'] - y) / grid['yres'])
+    col[(col == grid['nx']) & (x <= grid['xmax'])] = grid['nx'] - 1
+    lin[(lin == grid['ny']) & (y >= grid['ymin'])] = grid['ny'] - 1
+
+    valid = (col >= 0) & (col < grid['nx']) & (lin >= 0) & (lin < grid['ny'])
+    index = np.full(lats.shape, -1, dtype=np.int64)
+    index[valid] = lin[valid].astype(np.int64) * grid['nx'] + col[valid].astype(np.int64)
+
+    return index
+
+# Accumulate the GLM points on the grid (counts, or summed values if weights are given, e.g. energies)
+# If density is None a new (ny, nx) array is created, otherwise the counts are added to it, so
+# the same array can be updated granule by granule
+def GLM_density(grid, lats, lons, weights=None, density=None):
+
+    if density is None:
+        density = np.zeros((grid['ny'], grid['nx']), dtype=np.float64)
+
+    index = GLM_grid_index(grid, lats, lons)
+    valid = index >= 0
+
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[valid]
+
+    counts = np.bincount(index[valid], weights=weights, minlength=grid['nx'] * grid['ny'])
+    density += counts.reshape(grid['ny'], grid['nx'])
+
+    return density
+
+#-----------------------------------------------------------------------------------------------------------
+# Functions for a local GLM event store
+# Each hour has its own directory (YYYYJJJHH) with one flat binary file per column, where the events of
+# every granule are appended, and an index.json with the position of each granule in the columns:
+# lat, lon, energy (float32), time (float32, seconds since the hour), parent (int32, parent group id)
+# and cell (uint16, 1° x 1° cell number). The events of a granule are sorted by cell, and the index keeps
+# the [cell, start, count] of each cell of the granule, so a query reads only the cells of its extent
+GLM_STORE_COLUMNS = {'lat': np.float32, 'lon': np.float32, 'energy': np.float32, 
+                     'time': np.float32, 'parent': np.int32, 'cell': np.uint16}
+
+def GLM_store_cell(lats, lons):
+    lin = np.clip(np.floor(lats).astype(np.int32) + 90, 0, 179)
+    col = np.clip(np.floor(lons).astype(np.int32) + 180, 0, 359)
+    return (lin * 360 + col).astype(np.uint16)
+
+def GLM_store_index(store, hour):
+    import json
+    index_file = f'{store}/{hour.strftime("%Y%j%H")}/index.json'
+    if os.path.exists(index_file):
+        with open(index_file) as f:
+            return json.load(f)
+    return {'granules': []}
+
+# Names of the granules already in the store, for the hours of the interval
+def GLM_store_names(store, yyyymmddhhmnss_ini, yyyymmddhhmnss_end):
+    from datetime import timedelta
+
+    date_ini = datetime.strptime(yyyymmddhhmnss_ini, '%Y%m%d%H%M%S')
+    date_end = datetime.strptime(yyyymmddhhmnss_end, '%Y%m%d%H%M%S')
+
+    names = set()
+    # Granules are stored in the hour they start, so the previous hour is checked too
+    hour = date_ini.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    while (hour <= date_end):
+        names.update(granule['name'] for granule in GLM_store_index(store, hour)['granules'])
+        hour = hour + timedelta(hours=1)
+    return names
+
+# Add the events of a GLM file to the store
+def GLM_store_add(store, file_name):
+    import json
+    from netCDF4 import Dataset
+
+    name = os.path.basename(file_name).split('.')[0]
+    # File name: OR_GLM-L2-LCFA_G16_sYYYYJJJHHMMSSs_eYYYYJJJHHMMSSs_cYYYYJJJHHMMSSs.nc
+    parts = name.split('_')
+    start = datetime.strptime(parts[3][1:14], '%Y%j%H%M%S')
+    end = datetime.strptime(parts[4][1:14], '%Y%j%H%M%S')
+    hour = start.replace(minute=0, second=0, microsecond=0)
+
+    index = GLM_store_index(store, hour)
+    if name in [granule['name'] for granule in index['granules']]:
+        print(f'File {name} already in the store')
+        return
+
+    # Read the events
+    glm = Dataset(file_name)
+    lats = np.asarray(glm.variables['event_lat'][:], dtype=np.float32)
+    lons = np.asarray(glm.variables['event_lon'][:], dtype=np.float32)
+    columns = {'lat': lats, 'lon': lons,
+               'energy': glm.variables['event_energy'][:],
+               'parent': glm.variables['event_parent_group_id'][:],
+               'cell': GLM_store_cell(lats, lons)}
+
+    # Event times (seconds since the reference in the variable units) converted to seconds since the hour
+    offsets = np.asarray(glm.variables['event_time_offset'][:], dtype=np.float64)
+    reference = glm.variables['event_time_offset'].units.split('since ')[1].strip()
+    reference = datetime.strptime(reference[:19], '%Y-%m-%d %H:%M:%S')
+    columns['time'] = offsets + (reference - hour).total_seconds()
+    glm.close()
+
+    # Sort the events by cell (keeping the time order inside each cell) and find the range of each cell
+    order = np.argsort(columns['cell'], kind='stable')
+    columns = {column: np.asarray(values)[order] for column, values in columns.items()}
+    cells, starts, counts = np.unique(columns['cell'], return_index=True, return_counts=True)
+
+    # Append the columns. Rows after the last granule of the index (left by an interrupted add) are removed
+    # first, so the offsets of the index always match the columns
+    directory = f'{store}/{hour.strftime("%Y%j%H")}'
+    os.makedirs(directory, exist_ok=True)
+    offset = max([granule['offset'] + granule['count'] for granule in index['granules']], default=0)
+    for column, dtype in GLM_STORE_COLUMNS.items():
+        with open(f'{directory}/{column}', 'ab') as f:
+            f.truncate(offset * np.dtype(dtype).itemsize)
+            np.asarray(columns[column], dtype=dtype).tofile(f)
+
+    # Update the index (written to a temporary file and renamed, so it is never left incomplete)
+    index['granules'].append({'name': name, 'offset': offset, 'count': int(lats.shape[0]),
+                              'start': (start - hour).total_seconds(), 'end': (end - hour).total_seconds(),
+                              'cells': [[int(c), int(s), int(n)] for c, s, n in zip(cells, starts, counts)]})
+    with open(f'{directory}/index.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(f'{directory}/index.tmp', f'{directory}/index.json')
+
+# Get the lats, lons and energies of the events inside the extent [min lon, min lat, max lon, max lat]
+# between two dates, reading only the granules of the interval from the memory-mapped columns (the store
+# keeps all the events of each file, and the extent is only applied here, to the cells that intersect it)
+def GLM_store_query(store, extent, yyyymmddhhmnss_ini, yyyymmddhhmnss_end):
+    from datetime import timedelta
+
+    date_ini = datetime.strptime(yyyymmddhhmnss_ini, '%Y%m%d%H%M%S')
+    date_end = datetime.strptime(yyyymmddhhmnss_end, '%Y%m%d%H%M%S')
+
+    # Cells that intersect the extent
+    cells = np.zeros(180 * 360, dtype=bool)
+    lin = np.arange(int(np.floor(extent[1])), int(np.floor(extent[3])) + 1) + 90
+    col = np.arange(int(np.floor(extent[0])), int(np.floor(extent[2])) + 1) + 180
+    lin = lin[(lin >= 0) & (lin < 180)]
+    col = col[(col >= 0) & (col < 360)]
+    cells[(lin[:, None] * 360 + col[None, :]).ravel()] = True
+
+    lats, lons, energies = [], [], []
+
+    hour = date_ini.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    while (hour <= date_end):
+        directory = f'{store}/{hour.strftime("%Y%j%H")}'
+        t0 = (date_ini - hour).total_seconds()
+        t1 = (date_end - hour).total_seconds()
+        granules = [granule for granule in GLM_store_index(store, hour)['granules'] 
+                    if granule['count'] > 0 and granule['start'] <= t1 and granule['end'] >= t0]
+
+        if len(granules) > 0:
+            data = {column: np.memmap(f'{directory}/{column}', dtype=dtype, mode='r') 
+                    for column, dtype in GLM_STORE_COLUMNS.items()}
+            for granule in granules:
+                # Ranges of the cells of the extent (the whole granule if it has no cell ranges)
+                if 'cells' in granule:
+                    ranges = [(granule['offset'] + start, granule['offset'] + start + count) 
+                              for cell, start, count in granule['cells'] if cells[cell]]
+                else:
+                    ranges = [(granule['offset'], granule['offset'] + granule['count'])]
+                for first, last in ranges:
+                    s = slice(first, last)
+                    lat = data['lat'][s]
+                    lon = data['lon'][s]
+                    time = data['time'][s]
+                    inside = (time >= t0) & (time <= t1) & \
+                             (lon >= extent[0]) & (lon <= extent[2]) & (lat >= extent[1]) & (lat <= extent[3])
+                    lats.append(lat[inside])
+                    lons.append(lon[inside])
+                    energies.append(data['energy'][s][inside])
+
+        hour = hour + timedelta(hours=1)
+
+    if len(lats) == 0:
+        return np.array([], dtype=np.float32), np.array([], dtype=np.float32), np.array([], dtype=np.float32)
+
+    return np.concatenate(lats), np.concatenate(lons), np.concatenate(energies)
+
+#-----------------------------------------------------------------------------------------------------------
+# Functions to harmonize the resolution of ABI bands
+
+# Reduce the resolution of an array by an integer factor, taking the average ('mean') or the maximum
+# ('max') of each factor x factor block (rows / columns that don't fill a block are discarded)
+def block_reduce(data, factor, method='mean'):
+    ny = (data.shape[0] // factor) * factor
+    nx = (data.shape[1] // factor) * factor
+    blocks = data[:ny, :nx].reshape(ny // factor, factor, nx // factor, factor)
+    if method == 'max':
+        return blocks.max(axis=(1, 3))
+    return blocks.mean(axis=(1, 3))
+
+# Increase the resolution of an array by an integer factor, repeating each pixel
+def block_repeat(data, factor):
+    return np.repeat(np.repeat(data, factor, axis=0), factor, axis=1)
+
+# Read the rows / cols of a NetCDF variable as float32 (NaN where masked or outside the array)
+def read_window(variable, lin_ini, lin_end, col_ini, col_end):
+    window = np.full((lin_end - lin_ini, col_end - col_ini), np.nan, dtype=np.float32)
+    a, b = max(lin_ini, 0), min(lin_end, variable.shape[0])
+    c, d = max(col_ini, 0), min(col_end, variable.shape[1])
+    if (a < b) and (c < d):
+        values = variable[a:b, c:d]
+        window[a - lin_ini:b - lin_ini, c - col_ini:d - col_ini] = np.ma.filled(np.ma.asarray(values, dtype=np.float32), np.nan)
+    return window
+
+# Read the extent [min lon, min lat, max lon, max lat] of a band on the grid of a reference band
+# (e.g. band 2 at 0.5 km on the grid of band 13 at 2 km). The windows are aligned using the fixed grid
+# x / y coordinates of both files. Finer bands are block-averaged (method='mean') or block-maximized
+# (method='max'), reading 'chunk' lines of the reference grid at a time, so the full resolution
+# array is never loaded. Coarser bands are upsampled repeating the pixels.
+def read_band_window(nc, extent, ref, var='CMI', method='mean', chunk=256):
+
+    # Window on the reference grid
+    lly, llx = geo2grid(extent[1], extent[0], ref)
+    ury, urx = geo2grid(extent[3], extent[2], ref)
+    lines, cols = lly - ury, urx - llx
+
+    # Fixed grid coordinates (scan angles) of both grids
+    xscale_r, xoffset_r = ref.variables['x'].scale_factor, ref.variables['x'].add_offset
+    yscale_r, yoffset_r = ref.variables['y'].scale_factor, ref.variables['y'].add_offset
+    xscale, xoffset = nc.variables['x'].scale_factor, nc.variables['x'].add_offset
+    yscale, yoffset = nc.variables['y'].scale_factor, nc.variables['y'].add_offset
+
+    # Position of the upper left corner of the window in the band grid (in pixels, from its upper left corner)
+    col_pos = ((xoffset_r + (llx - 0.5) * xscale_r) - (xoffset - 0.5 * xscale)) / xscale
+    lin_pos = ((yoffset_r + (ury - 0.5) * yscale_r) - (yoffset - 0.5 * yscale)) / yscale
+
+    variable = nc.variables[var]
+    ratio = xscale_r / xscale
+
+    if ratio >= 1:
+        # Same or finer resolution: block reduce
+        factor = int(round(ratio))
+        col_ini = int(round(col_pos))
+        lin_ini = int(round(lin_pos))
+        data = np.empty((lines, cols), dtype=np.float32)
+        for lin in range(0, lines, chunk):
+            n = min(chunk, lines - lin)
+            window = read_window(variable, lin_ini + lin * factor, lin_ini + (lin + n) * factor, col_ini, col_ini + cols * factor)
+            data[lin:lin + n] = window if factor == 1 else block_reduce(window, factor, method)
+    else:
+        # Coarser resolution: repeat the pixels
+        factor = int(round(1 / ratio))
+        col_ini = int(np.floor(col_pos))
+        lin_ini = int(np.floor(lin_pos))
+        col_sub = int(round((col_pos - col_ini) * factor))
+        lin_sub = int(round((lin_pos - lin_ini) * factor))
+        window = read_window(variable, lin_ini, lin_ini + (lines + lin_sub) // factor + 1, col_ini, col_ini + (cols + col_sub) // factor + 1)
+        data = block_repeat(window, factor)[lin_sub:lin_sub + lines, col_sub:col_sub + cols]
+
+    return data
+
+#-----------------------------------------------------------------------------------------------------------
+# RGB recipes
+# Each component is a combination of bands ({band number: coefficient}) with its minimum, maximum and gamma.
+# 'invert': True reverses the component after the normalization (1 - value).
+# IR bands in °C and visible / near IR bands in reflectance factor (0 - 1)
+RGB_RECIPES = {
+    # http://rammb.cira.colostate.edu/training/visit/quick_guides/QuickGuide_GOESR_AirMassRGB_final.pdf
+    'airmass': {'R': {'bands': {8: 1, 10: -1}, 'min': -26.2, 'max': 0.6, 'gamma': 1.0},
+                'G': {'bands': {12: 1, 13: -1}, 'min': -43.2, 'max': 6.7, 'gamma': 1.0},
+                'B': {'bands': {8: 1}, 'min': -64.65, 'max': -29.25, 'gamma': 1.0, 'invert': True}},
+    # http://rammb.cira.colostate.edu/training/visit/quick_guides/Day_Cloud_Phase_Distinction.pdf
+    'day_cloud_phase': {'R': {'bands': {13: 1}, 'min': -53.5, 'max': 7.5, 'gamma': 1.0, 'invert': True},
+                        'G': {'bands': {2: 1}, 'min': 0.0, 'max': 0.78, 'gamma': 1.0},
+                        'B': {'bands': {5: 1}, 'min': 0.01, 'max': 0.59, 'gamma': 1.0}},
+}
+
+# Create an RGB from a recipe (name in RGB_RECIPES or a dictionary) and a dictionary with the band arrays
+# ({band number: array}). The components are computed in place (clip, normalize, gamma and invert) and 
+# written in a (lines, cols, 3) float32 array. A preallocated 'out' array may be given.
+# With dtype=np.uint8 the components are quantized (0 - 255, NaN as 0) directly into an interleaved uint8
+# array, 4x smaller than float32, that can be used as is by imshow.
+def make_RGB(recipe, bands, out=None, dtype=np.float32):
+
+    if isinstance(recipe, str):
+        recipe = RGB_RECIPES[recipe]
+
+    # Masked values are converted to NaN
+    bands = {band: np.ma.filled(data.astype(np.float32), np.nan) if np.ma.isMaskedArray(data) else data 
+             for band, data in bands.items()}
+
+    shape = next(iter(bands.values())).shape
+    if out is None:
+        out = np.empty(shape + (3,), dtype=dtype)
+    quantize = (out.dtype == np.uint8)
+    channel = np.empty(shape, dtype=np.float32)
+
+    for i, component in enumerate(['R', 'G', 'B']):
+        c = recipe[component]
+
+        # Band combination
+        for n, (band, coefficient) in enumerate(c['bands'].items()):
+            if n == 0:
+                np.multiply(bands[band], coefficient, out=channel, casting='unsafe')
+            elif coefficient == 1:
+                np.add(channel, bands[band], out=channel, casting='unsafe')
+            elif coefficient == -1:
+                np.subtract(channel, bands[band], out=channel, casting='unsafe')
+            else:
+                channel += coefficient * bands[band]
+
+        # Clip, normalize, gamma and invert
+        np.clip(channel, c['min'], c['max'], out=channel)
+        np.subtract(channel, c['min'], out=channel)
+        np.multiply(channel, 1.0 / (c['max'] - c['min']), out=channel)
+        if c.get('gamma', 1.0) != 1.0:
+            np.power(channel, 1.0 / c['gamma'], out=channel)
+        if c.get('invert', False):
+            np.subtract(1.0, channel, out=channel)
+
+        if quantize:
+            np.multiply(channel, 255.0, out=channel)
+            np.rint(channel, out=channel)
+            np.nan_to_num(channel, copy=False, nan=0.0)
+            out[..., i] = channel
+        else:
+            out[..., i] = channel
+
+    return out
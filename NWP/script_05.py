@@ -5,7 +5,7 @@
 import pygrib                              # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
 import matplotlib.pyplot as plt            # Plotting library
 import cartopy, cartopy.crs as ccrs        # Plot maps
-import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities import load_shapefile       # Read shapefiles (cached)
 import numpy as np                         # Scientific computing with Python
 #----------------------------------------------------------------------------------------------------------- 
 
@@ -46,7 +46,7 @@ ax = plt.axes(projection=ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='red',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -5,7 +5,7 @@
 import pygrib                              # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
 import matplotlib.pyplot as plt            # Plotting library
 import cartopy, cartopy.crs as ccrs        # Plot maps
-import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities import load_shapefile       # Read shapefiles (cached)
 import numpy as np                         # Scientific computing with Python
 import matplotlib                          # Comprehensive library for creating static, animated, and interactive visualizations in Python 
 #----------------------------------------------------------------------------------------------------------- 
@@ -51,7 +51,7 @@ img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add a shapefile
 # https://geoftp.ibge.gov.br/organizacao_do_territorio/malhas_territoriais/malhas_municipais/municipio_2019/Brasil/BR/br_unidades_da_federacao.zip
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
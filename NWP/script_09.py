@@ -5,7 +5,9 @@
 import pygrib                              # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
 import matplotlib.pyplot as plt            # Plotting library
 import cartopy, cartopy.crs as ccrs        # Plot maps
-import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities import load_shapefile       # Read shapefiles (cached)
+from utilities import subset_GRIB          # Cut GRIB fields to the extent (cached grid subset)
+from utilities import run_forecast_sequence # Run the forecast hours in parallel
 import numpy as np                         # Scientific computing with Python
 import matplotlib                          # Comprehensive library for creating static, animated, and interactive visualizations in Python 
 import os                                  # Miscellaneous operating system interfaces
@@ -27,9 +29,13 @@ hour_ini = 0   # Init time
 hour_end = 24  # End time
 hour_int = 3   # Interval
 
+# Number of processes (the forecast hours are independent, so each one is plotted by one of them)
+workers = 4
+
 #-----------------------------------------------------------------------------------------------------------
 
-for hour in range(hour_ini, hour_end + 1, hour_int):
+# Plot one forecast hour (returns the image name, or None when the file does not exist)
+def plot_hour(hour):
 
     # File to process
     grib = path + str(hour).zfill(3)
@@ -57,7 +63,7 @@ for hour in range(hour_ini, hour_end + 1, hour_int):
         print('Valid: ' + valid + ' UTC')
 
         # Read the data for a specific region
-        tmtmp, lats, lons = grb.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)
+        tmtmp, lats, lons = subset_GRIB(grb, extent)
 
         #-----------------------------------------------------------------------------------------------------------
         # Convert from K to °C
@@ -76,11 +82,8 @@ for hour in range(hour_ini, hour_end + 1, hour_int):
         # Use the Cilindrical Equidistant projection in cartopy
         ax = plt.axes(projection=ccrs.PlateCarree())
 
-        # Define the image extent
-        img_extent = [extent[0], extent[2], extent[1], extent[3]]
-
         # Add a shapefile
-        shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+        shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
         ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
         # Add coastlines, borders and gridlines
@@ -116,4 +119,17 @@ for hour in range(hour_ini, hour_end + 1, hour_int):
         #----------------------------------------------------------------------------------------------------------- 
 
         # Save the image
-        plt.savefig(f'{dir}\image_loop_{str(hour)}.png', bbox_inches='tight', pad_inches=0, dpi=100)
\ No newline at end of file
+        file_name = f'{dir}//image_loop_{str(hour)}.png'
+        plt.savefig(file_name, bbox_inches='tight', pad_inches=0, dpi=100)
+
+        # Close the figure (the worker process plots other hours)
+        plt.close()
+        return file_name
+
+#-----------------------------------------------------------------------------------------------------------
+
+# Plot the forecast hours in a pool of processes (matplotlib is not thread safe). The image names
+# arrive in the forecast order
+if __name__ == '__main__':
+    images = run_forecast_sequence(plot_hour, range(hour_ini, hour_end + 1, hour_int), workers=workers)
+    print('\nImages:', [image for image in images if image is not None])
@@ -2,16 +2,17 @@
 # INPE / CPTEC Training: NWP Data Processing With Python - Script 10: Creating an Animation
 # Author: Diego Souza
 #-----------------------------------------------------------------------------------------------------------
-import imageio.v2 as imageio       # Python interface to read and write a wide range of image data
+from utilities import open_animation, append_frame, close_animation # Our functions for the animation
 
 # Images we want to include in the GIF
 files = ['image_loop_0.png', 'image_loop_3.png', 'image_loop_6.png', 'image_loop_9.png', 'image_loop_12.png', 
          'image_loop_15.png', 'image_loop_18.png', 'image_loop_21.png', 'image_loop_24.png']
 
-# Create the GIF
-images = []
+# Create the GIF (each image is written as soon as it is read, so only one image is in memory)
+# (the same works for an animated WebP or a MP4 video, e.g. 'Animation//animation.mp4')
+animation = open_animation('Animation//animation.gif', fps=1)
 for file in files:
-    images.append(imageio.imread('Animation//' + file))
+    append_frame(animation, 'Animation//' + file)
 
 # Save the GIF
-imageio.mimsave('Animation//animation.gif', images, fps=1)
\ No newline at end of file
+close_animation(animation)
\ No newline at end of file
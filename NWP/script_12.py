@@ -5,7 +5,8 @@
 import pygrib                              # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
 import matplotlib.pyplot as plt            # Plotting library
 import cartopy, cartopy.crs as ccrs        # Plot maps
-import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities import load_shapefile       # Read shapefiles (cached)
+from utilities import subset_GRIB          # Cut GRIB fields to the extent (cached grid subset)
 import numpy as np                         # Scientific computing with Python
 import matplotlib                          # Comprehensive library for creating static, animated, and interactive visualizations in Python 
 #-----------------------------------------------------------------------------------------------------------  
@@ -34,7 +35,7 @@ print('Valid: ' + valid + ' UTC')
 #-----------------------------------------------------------------------------------------------------------
 
 # Read the data for a specific region
-precip, lats, lons = grb.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)
+precip, lats, lons = subset_GRIB(grb, extent)
 
 # Convert from kg m**-2 s**-1 to mm/h
 precip = precip * 60 * 60
@@ -54,7 +55,7 @@ precip[precip < 0.1] = np.nan
 totpr = grib.select(name='Total Precipitation', typeOfLevel = 'surface')[1]
 
 # Read the data for a specific region
-totpr = totpr.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+totpr = subset_GRIB(totpr, extent)[0]
 
 # Smooth the contours
 totpr = scipy.ndimage.zoom(totpr, 3)
@@ -89,7 +90,7 @@ land = axs[0].add_feature(cfeature.LAND, facecolor='whitesmoke')
 ocean = axs[0].add_feature(cfeature.OCEAN, facecolor='white')
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 axs[0].add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -130,7 +131,7 @@ land = axs[1].add_feature(cfeature.LAND, facecolor='whitesmoke')
 ocean = axs[1].add_feature(cfeature.OCEAN, facecolor='white')
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 axs[1].add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -5,7 +5,8 @@
 import pygrib                              # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
 import matplotlib.pyplot as plt            # Plotting library
 import cartopy, cartopy.crs as ccrs        # Plot maps
-import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities import load_shapefile       # Read shapefiles (cached)
+from utilities import subset_GRIB          # Cut GRIB fields to the extent (cached grid subset)
 import numpy as np                         # Scientific computing with Python
 import matplotlib                          # Comprehensive library for creating static, animated, and interactive visualizations in Python 
 #-----------------------------------------------------------------------------------------------------------  
@@ -32,7 +33,7 @@ print('Forecast: +' + ftime)
 print('Valid: ' + valid + ' UTC')
 
 # Read the data for a specific region
-ucomp, lats, lons = ucomp.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)
+ucomp, lats, lons = subset_GRIB(ucomp, extent)
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -40,7 +41,7 @@ ucomp, lats, lons = ucomp.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,
 vcomp = grib.select(name='V component of wind', typeOfLevel = 'isobaricInhPa', level = 850)[0]
 
 # Read the data for a specific region
-vcomp = vcomp.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+vcomp = subset_GRIB(vcomp, extent)[0]
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -48,7 +49,7 @@ vcomp = vcomp.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[
 prmls = grib.select(name='Pressure reduced to MSL')[0]
 
 # Read the data for a specific region
-prmls = prmls.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+prmls = subset_GRIB(prmls, extent)[0]
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -70,7 +71,7 @@ img_extent = [extent[0], extent[2], extent[1], extent[3]]
 ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
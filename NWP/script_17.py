@@ -2,10 +2,12 @@
 # INPE / CPTEC Training: NWP Data Processing With Python - Script 17: 2 x 2 Plot - Streamlines (250, 500, 700 and 850 hPa)  
 # Author: Diego Souza
 #-----------------------------------------------------------------------------------------------------------
-import pygrib                              # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
+from utilities import index_GRIB           # Index a GRIB file (read once)
+from utilities import select_GRIB          # Select GRIB messages by the index
+from utilities import GRIB_cube            # Read a variable in many levels
 import matplotlib.pyplot as plt            # Plotting library
 import cartopy, cartopy.crs as ccrs        # Plot maps
-import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities import load_shapefile       # Read shapefiles (cached)
 import numpy as np                         # Scientific computing with Python
 import matplotlib                          # Comprehensive library for creating static, animated, and interactive visualizations in Python 
 #-----------------------------------------------------------------------------------------------------------   
@@ -13,13 +15,13 @@ import matplotlib                          # Comprehensive library for creating
 # Select the extent [min. lon, min. lat, max. lon, max. lat]
 extent = [-100.0, 0.00, -40.00, 40.00]
 
-# Open the GRIB file
-grib = pygrib.open("gfs.t00z.pgrb2full.0p50.f000")
+# Index the GRIB file (the index is saved next to the file and used again in the next runs)
+grib = index_GRIB("gfs.t00z.pgrb2full.0p50.f000")
 
 #-----------------------------------------------------------------------------------------------------------
 
-# Select the variable
-ucomp_250 = grib.select(name='U component of wind', typeOfLevel = 'isobaricInhPa', level = 250)[0]
+# Select the variable (for the date / time information)
+ucomp_250 = select_GRIB(grib, name='U component of wind', typeOfLevel = 'isobaricInhPa', level = 250)[0]
 
 # Get information from the file    
 init  = str(ucomp_250.analDate)      # Init date / time
@@ -31,64 +33,10 @@ print('Run: ' + run + 'Z')
 print('Forecast: +' + ftime)
 print('Valid: ' + valid + ' UTC')
 
-# Read the data for a specific region
-ucomp_250, lats, lons = ucomp_250.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)
-
-#-----------------------------------------------------------------------------------------------------------
-
-# Select the variable
-vcomp_250 = grib.select(name='V component of wind', typeOfLevel = 'isobaricInhPa', level = 250)[0]
-
-# Read the data for a specific region
-vcomp_250 = vcomp_250.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-
-#-----------------------------------------------------------------------------------------------------------
-
-# Select the variable
-ucomp_500 = grib.select(name='U component of wind', typeOfLevel = 'isobaricInhPa', level = 500)[0]
-
-# Read the data for a specific region
-ucomp_500 = ucomp_500.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-
-#-----------------------------------------------------------------------------------------------------------
-
-# Select the variable
-vcomp_500 = grib.select(name='V component of wind', typeOfLevel = 'isobaricInhPa', level = 500)[0]
-
-# Read the data for a specific region
-vcomp_500 = vcomp_500.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-
-#-----------------------------------------------------------------------------------------------------------
-
-# Select the variable
-ucomp_700 = grib.select(name='U component of wind', typeOfLevel = 'isobaricInhPa', level = 700)[0]
-
-# Read the data for a specific region
-ucomp_700 = ucomp_700.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-
-#-----------------------------------------------------------------------------------------------------------
-
-# Select the variable
-vcomp_700 = grib.select(name='V component of wind', typeOfLevel = 'isobaricInhPa', level = 700)[0]
-
-# Read the data for a specific region
-vcomp_700 = vcomp_700.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-
-#-----------------------------------------------------------------------------------------------------------
-
-# Select the variable
-ucomp_850 = grib.select(name='U component of wind', typeOfLevel = 'isobaricInhPa', level = 850)[0]
-
-# Read the data for a specific region
-ucomp_850 = ucomp_850.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-
-#-----------------------------------------------------------------------------------------------------------
-
-# Select the variable
-vcomp_850 = grib.select(name='V component of wind', typeOfLevel = 'isobaricInhPa', level = 850)[0]
-
-# Read the data for a specific region
-vcomp_850 = vcomp_850.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+# Read the U and V components in 250, 500, 700 and 850 hPa for a specific region (variable x level x lat x lon)
+wind, lats, lons = GRIB_cube(grib, ['U component of wind', 'V component of wind'], [250, 500, 700, 850], extent)
+ucomp_250, ucomp_500, ucomp_700, ucomp_850 = wind[0]
+vcomp_250, vcomp_500, vcomp_700, vcomp_850 = wind[1]
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -133,7 +81,7 @@ axs[0,0].clabel(img2, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f', c
 img3 = axs[0,0].streamplot(lons, lats, ucomp_250, vcomp_250, density=[4, 4], linewidth=1, color='gray', transform=ccrs.PlateCarree())
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 axs[0,0].add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -166,7 +114,7 @@ axs[0,1].clabel(img5, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f', c
 img6 = axs[0,1].streamplot(lons, lats, ucomp_500, vcomp_500, density=[4, 4], linewidth=1, color='gray', transform=ccrs.PlateCarree())
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 axs[0,1].add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -199,7 +147,7 @@ axs[1,0].clabel(img8, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f', c
 img9 = axs[1,0].streamplot(lons, lats, ucomp_700, vcomp_700, density=[4, 4], linewidth=1, color='gray', transform=ccrs.PlateCarree())
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 axs[1,0].add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -232,7 +180,7 @@ axs[1,1].clabel(img11, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f',
 img12 = axs[1,1].streamplot(lons, lats, ucomp_850, vcomp_850, density=[4, 4], linewidth=1, color='gray', transform=ccrs.PlateCarree())
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 axs[1,1].add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -2,10 +2,13 @@
 # INPE / CPTEC Training: NWP Data Processing With Python - Script 18: Galvez Davison Index (GDI) 
 # Author: Diego Souza / HUGE THANKS TO JUAN AMIDES FIGUEROA (MARN EL SALVADOR) AND JOSE GALVEZ
 #-----------------------------------------------------------------------------------------------------------
-import pygrib                              # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
+from utilities import index_GRIB           # Index a GRIB file (read once)
+from utilities import select_GRIB          # Select GRIB messages by the index
+from utilities import GRIB_cube            # Read a variable in many levels
 import matplotlib.pyplot as plt            # Plotting library
 import cartopy, cartopy.crs as ccrs        # Plot maps
-import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities import load_shapefile       # Read shapefiles (cached)
+from utilities import subset_GRIB          # Cut GRIB fields to the extent (cached grid subset)
 import numpy as np                         # Scientific computing with Python
 import matplotlib                          # Comprehensive library for creating static, animated, and interactive visualizations in Python
 import math                                # Methematical Functions
@@ -14,13 +17,13 @@ import math                                # Methematical Functions
 # Select the extent [min. lon, min. lat, max. lon, max. lat]
 extent = [-100.0, 0.00, -40.00, 40.00]
 
-# Open the GRIB file
-grib = pygrib.open("gfs.t00z.pgrb2full.0p50.f000")
+# Index the GRIB file (the index is saved next to the file and used again in the next runs)
+grib = index_GRIB("gfs.t00z.pgrb2full.0p50.f000")
 
 #-----------------------------------------------------------------------------------------------------------
  
 # Read the surface pressure
-sfcps = grib.select(name='Surface pressure')[0]
+sfcps = select_GRIB(grib, name='Surface pressure')[0]
 
 # Get information from the file    
 init  = str(sfcps.analDate)      # Init date / time
@@ -33,59 +36,17 @@ print('Forecast: +' + ftime)
 print('Valid: ' + valid + ' UTC')
 
 # Read the data for a specific region
-sfcps, lats, lons = sfcps.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)
+sfcps, lats, lons = subset_GRIB(sfcps, extent)
 
 # Convert the surface pressure to hectopascal
 sfcps = sfcps / 100
 
 #-----------------------------------------------------------------------------------------------------------
-# Read the temperature in 950 hPa
-temp950 = grib.select(name='Temperature', typeOfLevel = 'isobaricInhPa', level = 950)[0]
-
-# Read the data for a specific region
-temp950 = temp950.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-#-----------------------------------------------------------------------------------------------------------
-# Read the specific humidity in 950 hPa
-spfh950 = grib.select(name='Specific humidity', typeOfLevel = 'isobaricInhPa', level = 950)[0]
-
-# Read the data for a specific region
-R950 = spfh950.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-#-----------------------------------------------------------------------------------------------------------
-# Read the temperature in 850 hPa
-temp850 = grib.select(name='Temperature', typeOfLevel = 'isobaricInhPa', level = 850)[0]
-
-# Read the data for a specific region
-temp850 = temp850.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-#-----------------------------------------------------------------------------------------------------------
-# Read the specific humidity in 850 hPa
-spfh850 = grib.select(name='Specific humidity', typeOfLevel = 'isobaricInhPa', level = 850)[0]
-
-# Read the data for a specific region
-R850 = spfh850.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-#-----------------------------------------------------------------------------------------------------------
-# Read the temperature in 700 hPa
-temp700 = grib.select(name='Temperature', typeOfLevel = 'isobaricInhPa', level = 700)[0]
-
-# Read the data for a specific region
-temp700 = temp700.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-#-----------------------------------------------------------------------------------------------------------
-# Read the specific humidity in 700 hPa
-spfh700 = grib.select(name='Specific humidity', typeOfLevel = 'isobaricInhPa', level = 700)[0]
-
-# Read the data for a specific region
-R700 = spfh700.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-#-----------------------------------------------------------------------------------------------------------
-# Read the temperature in 500 hPa
-temp500 = grib.select(name='Temperature', typeOfLevel = 'isobaricInhPa', level = 500)[0]
-
-# Read the data for a specific region
-temp500 = temp500.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
-#-----------------------------------------------------------------------------------------------------------
-# Read the specific humidity in 500 hPa
-spfh500 = grib.select(name='Specific humidity', typeOfLevel = 'isobaricInhPa', level = 500)[0]
-
-# Read the data for a specific region
-R500 = spfh500.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+# Read the temperature and the specific humidity in 950, 850, 700 and 500 hPa for a specific region 
+# (variable x level x lat x lon)
+cube = GRIB_cube(grib, ['Temperature', 'Specific humidity'], [950, 850, 700, 500], extent)[0]
+temp950, temp850, temp700, temp500 = cube[0]
+R950, R850, R700, R500 = cube[1]
 #-----------------------------------------------------------------------------------------------------------
 #---------------------------------------------------------------------------------------------
 
@@ -208,7 +169,7 @@ ax = plt.axes(projection=ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
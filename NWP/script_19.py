@@ -7,7 +7,7 @@ from netCDF4 import Dataset                         # Read / Write NetCDF4 files
 from osgeo import gdal                              # Python bindings for GDAL
 import matplotlib.pyplot as plt                     # Plotting library
 import cartopy, cartopy.crs as ccrs                 # Plot maps
-import cartopy.io.shapereader as shpreader          # Import shapefiles
+from utilities import load_shapefile                # Read shapefiles (cached)
 import os                                           # Miscellaneous operating system interfaces
 import numpy as np                                  # Scientific computing with Python
 from matplotlib import cm                           # Colormap handling utilities
@@ -89,7 +89,7 @@ colormap = "gray_r" # White to black for IR channels
 img1 = ax.imshow(data, origin='upper', vmin=-80, vmax=60, extent=img_extent, cmap=colormap, alpha=1.0)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='white',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -7,7 +7,7 @@ from netCDF4 import Dataset                         # Read / Write NetCDF4 files
 from osgeo import gdal                              # Python bindings for GDAL
 import matplotlib.pyplot as plt                     # Plotting library
 import cartopy, cartopy.crs as ccrs                 # Plot maps
-import cartopy.io.shapereader as shpreader          # Import shapefiles
+from utilities import load_shapefile                # Read shapefiles (cached)
 import os                                           # Miscellaneous operating system interfaces
 import numpy as np                                  # Scientific computing with Python
 from matplotlib import cm                           # Colormap handling utilities
@@ -122,7 +122,7 @@ img2 = ax.contour(lons, lats, gh500, cmap='jet', linewidths=1.5, levels=levels)
 ax.clabel(img2, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f', colors= 'blue') # For the labels to have the same colors as the cmap, just omit the "colors" variable
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='black',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -7,7 +7,8 @@ from netCDF4 import Dataset                         # Read / Write NetCDF4 files
 from osgeo import gdal                              # Python bindings for GDAL
 import matplotlib.pyplot as plt                     # Plotting library
 import cartopy, cartopy.crs as ccrs                 # Plot maps
-import cartopy.io.shapereader as shpreader          # Import shapefiles
+from utilities import load_shapefile                # Read shapefiles (cached)
+from utilities import subset_GRIB                   # Cut GRIB fields to the extent (cached grid subset)
 import os                                           # Miscellaneous operating system interfaces
 import numpy as np                                  # Scientific computing with Python
 from matplotlib import cm                           # Colormap handling utilities
@@ -125,7 +126,7 @@ print('Forecast: +' + ftime)
 print('Valid: ' + valid + ' UTC')
 
 # Read the data for a specific region
-prmls, lats, lons = prmls.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)
+prmls, lats, lons = subset_GRIB(prmls, extent)
 
 # Convert to hPa
 prmls = prmls / 100
@@ -136,13 +137,13 @@ prmls = prmls / 100
 hght_1000 = grib.select(name='Geopotential height', typeOfLevel = 'isobaricInhPa', level = 1000)[0]
 
 # Read the data for a specific region
-hght_1000 = hght_1000.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+hght_1000 = subset_GRIB(hght_1000, extent)[0]
 
 # Select the variable
 hght_500 = grib.select(name='Geopotential height', typeOfLevel = 'isobaricInhPa', level = 500)[0]
 
 # Read the data for a specific region
-hght_500 = hght_500.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+hght_500 = subset_GRIB(hght_500, extent)[0]
 
 # Calculate and smooth 1000-500 hPa thickness
 thickness_1000_500 = hght_500 - hght_1000
@@ -194,7 +195,7 @@ img3 = ax.contour(lons, lats, prmls, colors='black', linewidths=0.7, levels=leve
 ax.clabel(img3, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f', colors= 'black')
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='white',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
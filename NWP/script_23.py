@@ -7,14 +7,14 @@ from netCDF4 import Dataset                         # Read / Write NetCDF4 files
 from osgeo import gdal                              # Python bindings for GDAL
 import matplotlib.pyplot as plt                     # Plotting library
 import cartopy, cartopy.crs as ccrs                 # Plot maps
-import cartopy.io.shapereader as shpreader          # Import shapefiles
+from utilities import load_shapefile                # Read shapefiles (cached)
+from utilities import subset_GRIB                   # Cut GRIB fields to the extent (cached grid subset)
 import os                                           # Miscellaneous operating system interfaces
 import numpy as np                                  # Scientific computing with Python
-from matplotlib import cm                           # Colormap handling utilities
 from datetime import timedelta, date, datetime      # Basic Dates and time types
 from utilities import download_CMI                  # Our function for download
 from utilities import reproject                     # Our function for reproject
-from utilities import loadCPT                       # Import the CPT convert function
+from utilities import loadCPT_cmap                  # Import the CPT convert function
 import pygrib                                       # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
 gdal.PushErrorHandler('CPLQuietErrorHandler')       # Ignore GDAL warnings
 #-----------------------------------------------------------------------------------------------------------
@@ -83,7 +83,7 @@ print('Forecast: +' + ftime)
 print('Valid: ' + valid + ' UTC')
 
 # Read the data for a specific region
-ucomp, lats, lons = ucomp.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)
+ucomp, lats, lons = subset_GRIB(ucomp, extent)
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -91,7 +91,7 @@ ucomp, lats, lons = ucomp.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,
 vcomp = grib.select(name='V component of wind', typeOfLevel = 'isobaricInhPa', level = 250)[0]
 
 # Read the data for a specific region
-vcomp = vcomp.data(lat1=extent[1],lat2=extent[3],lon1=extent[0]+360,lon2=extent[2]+360)[0]
+vcomp = subset_GRIB(vcomp, extent)[0]
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -111,8 +111,8 @@ img_extent = [extent[0], extent[2], extent[1], extent[3]]
 ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 
 # Converts a CPT file to be used in Python
-cpt = loadCPT('SVGAWVX_TEMP.cpt')
-cmap = cm.colors.LinearSegmentedColormap('cpt', cpt) 
+# (the B / F / N entries of the CPT are used as the under / over / NaN colors)
+cmap = loadCPT_cmap('SVGAWVX_TEMP.cpt')
     
 # Plot the image
 img1 = ax.imshow(data, origin='upper', vmin=-112.15, vmax=77.00, extent=img_extent, cmap=cmap, alpha=1.0)
@@ -127,7 +127,7 @@ levels = np.arange(data_min,data_max,interval)
 img3 = ax.quiver(lons[::4,::4], lats[::4,::4], ucomp[::4,::4], vcomp[::4,::4], color='white')
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='white',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -7,7 +7,7 @@ from netCDF4 import Dataset                         # Read / Write NetCDF4 files
 from osgeo import gdal                              # Python bindings for GDAL
 import matplotlib.pyplot as plt                     # Plotting library
 import cartopy, cartopy.crs as ccrs                 # Plot maps
-import cartopy.io.shapereader as shpreader          # Import shapefiles
+from utilities import load_shapefile                # Read shapefiles (cached)
 import os                                           # Miscellaneous operating system interfaces
 import numpy as np                                  # Scientific computing with Python
 from matplotlib import cm                           # Colormap handling utilities
@@ -15,6 +15,7 @@ from datetime import timedelta, date, datetime      # Basic Dates and time types
 from utilities import download_CMI                  # Our function for download
 from utilities import reproject                     # Our function for reproject
 from utilities import loadCPT                       # Import the CPT convert function
+from utilities import make_RGB                      # Our function to create RGBs
 import pygrib                                       # Provides a high-level interface to the ECWMF ECCODES C library for reading GRIB files
 gdal.PushErrorHandler('CPLQuietErrorHandler')       # Ignore GDAL warnings
 #-----------------------------------------------------------------------------------------------------------
@@ -193,40 +194,8 @@ file = Dataset(filename_ret)
 data_13 = file.variables['Band1'][:]
 #------------------------------------------------------------------------------------------------------
 #------------------------------------------------------------------------------------------------------
-# RGB Components
-R = data_08 - data_10
-G = data_12 - data_13
-B = data_08
-
-# Minimuns and Maximuns
-Rmin = -26.2
-Rmax = 0.6
-
-Gmin = -43.2
-Gmax = 6.7
-
-Bmin = -29.25
-Bmax = -64.65
-
-R[R<Rmin] = Rmin
-R[R>Rmax] = Rmax
-
-G[G<Gmin] = Gmin
-G[G>Gmax] = Gmax
-
-B[B<Bmax] = Bmax
-B[B>Bmin] = Bmin
-
-# Choose the gamma
-gamma = 1
-
-# Normalize the data
-R = ((R - Rmin) / (Rmax - Rmin)) ** (1/gamma)
-G = ((G - Gmin) / (Gmax - Gmin)) ** (1/gamma)
-B = ((B - Bmin) / (Bmax - Bmin)) ** (1/gamma) 
-
-# Create the RGB
-RGB = np.stack([R, G, B], axis=2)
+# Create the RGB (the Airmass recipe, with the minimums, maximums and gamma of each component, is in utilities.py)
+RGB = make_RGB('airmass', {8: data_08, 10: data_10, 12: data_12, 13: data_13})
 #------------------------------------------------------------------------------------------------------
 #------------------------------------------------------------------------------------------------------
 
@@ -276,7 +245,7 @@ img2 = ax.contour(lons, lats, prmls, colors='cyan', linewidths=0.7, levels=level
 ax.clabel(img2, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f', colors= 'cyan')
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='white',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
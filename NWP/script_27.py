@@ -8,7 +8,7 @@ from netCDF4 import Dataset                                     # Read / Write N
 from osgeo import gdal                                          # Python bindings for GDAL
 import matplotlib.pyplot as plt                                 # Plotting library
 import cartopy, cartopy.crs as ccrs                             # Plot maps
-import cartopy.io.shapereader as shpreader                      # Import shapefiles
+from utilities import load_shapefile                            # Read shapefiles (cached)
 import os                                                       # Miscellaneous operating system interfaces
 import numpy as np                                              # Scientific computing with Python
 from matplotlib import cm                                       # Colormap handling utilities
@@ -206,7 +206,7 @@ plot_maxmin_points(lons, lats, prmls, 'max', 50, symbol='H', color='b',  transfo
 plot_maxmin_points(lons, lats, prmls, 'min', 25, symbol='L', color='r', transform=ccrs.PlateCarree())
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
@@ -0,0 +1,139 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CPTEC - Training: Python and GOES-R Imagery: Script 28 - Satellite + NWP Product Suite
+# Author: Diego Souza
+#-----------------------------------------------------------------------------------------------------------
+# Required modules
+from osgeo import gdal                              # Python bindings for GDAL
+import matplotlib                                   # Comprehensive library for creating visualizations in Python
+matplotlib.use('Agg')                               # Render without a display (the products run in processes)
+import matplotlib.pyplot as plt                     # Plotting library
+import cartopy, cartopy.crs as ccrs                 # Plot maps
+from utilities import load_shapefile                # Read shapefiles (cached)
+import os                                           # Miscellaneous operating system interfaces
+import numpy as np                                  # Scientific computing with Python
+import scipy.ndimage                                # Multidimensional image processing
+from datetime import datetime                       # Basic Dates and time types
+from utilities import download_CMI                  # Our function for download
+from utilities import reproject_CMI                 # Our function to read and reproject the CMI
+from utilities import index_GRIB, GRIB_field        # Our functions to index and read a GRIB file
+from utilities import node, run_pipeline            # Our product pipeline
+gdal.PushErrorHandler('CPLQuietErrorHandler')       # Ignore GDAL warnings
+#-----------------------------------------------------------------------------------------------------------
+# Input and output directories
+input = "Samples"; os.makedirs(input, exist_ok=True)
+output = "Output"; os.makedirs(output, exist_ok=True)
+
+# Select the extent [min. lon, min. lat, max. lon, max. lat]
+extent = [-100.0, 0.00, -40.00, 40.00]
+
+# Datetime to process (today in this example, to match the GFS date)
+#date = datetime.today().strftime('%Y%m%d')
+#yyyymmddhhmn = date + '0000'
+yyyymmddhhmn = '202303190000' # CHANGE THIS DATE TO THE SAME DATE OF YOUR NWP DATA
+
+# GRIB file
+grib_file = "gfs.t00z.pgrb2full.0p50.f000"
+
+#-----------------------------------------------------------------------------------------------------------
+# Download a band (the node fails, and the products that use it, when the file is not available)
+def download_band(yyyymmddhhmn, band, path_dest):
+    file_name = download_CMI(yyyymmddhhmn, band, path_dest)
+    if file_name == -1:
+        raise FileNotFoundError(f'Band {band} of {yyyymmddhhmn} not available')
+    return file_name
+
+# 1000-500 hPa thickness from the two geopotential heights
+def thickness(hght_500, hght_1000):
+    values, lats, lons, info = hght_500
+    return values - hght_1000[0], lats, lons, info
+
+# Plot the band 13 and (optionally) the contours of a GRIB field: the field values are multiplied by 'scale',
+# added to 'offset' and smoothed with 'zoom'
+def plot_product(satellite, field, file_name, title, levels=None, scale=1, offset=0, zoom=1, 
+                 cmap='jet', color='white', linewidth=1.0, linestyle='solid'):
+
+    data, dtime = satellite
+
+    # Choose the plot size (width x height, in inches)
+    plt.figure(figsize=(10,6))
+
+    # Use the Geostationary projection in cartopy
+    ax = plt.axes(projection=ccrs.PlateCarree())
+    ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
+
+    # Define the image extent
+    img_extent = [extent[0], extent[2], extent[1], extent[3]]
+
+    # Plot the image
+    img1 = ax.imshow(data, origin='upper', vmin=-80, vmax=60, extent=img_extent, cmap='gray_r', alpha=1.0)
+
+    # Plot the contours
+    if field is not None:
+        values, lats, lons, info = field
+        values = values * scale + offset
+        if zoom > 1:
+            values, lats, lons = [scipy.ndimage.zoom(v, zoom) for v in (values, lats, lons)]
+        img2 = ax.contour(lons, lats, values, cmap=cmap, linewidths=linewidth, linestyles=linestyle, levels=levels)
+        ax.clabel(img2, inline=1, inline_spacing=0, fontsize='10',fmt = '%1.0f')
+
+    # Add a shapefile
+    shapefile = load_shapefile('ne_10m_admin_1_states_provinces.shp', extent)
+    ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor=color,facecolor='none', linewidth=0.3)
+
+    # Add coastlines, borders and gridlines
+    ax.coastlines(resolution='10m', color=color, linewidth=0.8)
+    ax.add_feature(cartopy.feature.BORDERS, edgecolor=color, linewidth=0.5)
+    gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 5), ylocs=np.arange(-90, 90, 5), draw_labels=True)
+    gl.top_labels = False
+    gl.right_labels = False
+
+    # Add a colorbar
+    plt.colorbar(img1, label='Brightness Temperatures (°C)', extend='both', orientation='vertical', pad=0.03, fraction=0.05)
+
+    # Extract date
+    date = (datetime.strptime(dtime, '%Y-%m-%dT%H:%M:%S.%fZ'))
+
+    # Add a title
+    plt.title('GOES-16 Band 13 ' + date.strftime('%Y-%m-%d %H:%M') + ' UTC' + title, fontweight='bold', fontsize=6, loc='left')
+    plt.title('Reg.: ' + str(extent) , fontsize=6, loc='right')
+
+    # Save the image
+    plt.savefig(file_name, bbox_inches='tight', pad_inches=0, dpi=300)
+    plt.close()
+    return file_name
+
+#-----------------------------------------------------------------------------------------------------------
+# Products and their inputs: each input (the band 13, each GRIB field) is read only once, even when used by 
+# many products, and is released when all the products that use it are ready. The GRIB file is indexed once
+# (in this process) and each field process reads only its own message
+nodes = {
+    # Inputs
+    'band13_file': node(download_band, yyyymmddhhmn, 13, input, kind='io'),
+    'band13':      node(reproject_CMI, input, output, extent, inputs=['band13_file']),
+    'grib_index':  node(index_GRIB, grib_file, kind='io'),
+    'hght_500':    node(GRIB_field, extent, name='Geopotential height', typeOfLevel='isobaricInhPa', level=500, inputs=['grib_index']),
+    'hght_1000':   node(GRIB_field, extent, name='Geopotential height', typeOfLevel='isobaricInhPa', level=1000, inputs=['grib_index']),
+    'temp_850':    node(GRIB_field, extent, name='Temperature', typeOfLevel='isobaricInhPa', level=850, inputs=['grib_index']),
+    'prmsl':       node(GRIB_field, extent, name='Pressure reduced to MSL', inputs=['grib_index']),
+    'thickness':   node(thickness, inputs=['hght_500', 'hght_1000']),
+
+    # Products
+    'image_19': node(plot_product, None, f'{output}/image_19.png', '', inputs=['band13']),
+    'image_20': node(plot_product, f'{output}/image_20.png', ' + GFS Geopotential Height - 500 hPa (gpdm)', 
+                     levels=np.arange(400,600,2), scale=0.1, zoom=3, inputs=['band13', 'hght_500']),
+    'image_21': node(plot_product, f'{output}/image_21.png', ' + GFS Temperature - 850 hPa (°C)', 
+                     levels=np.arange(-20,48,2), offset=-273.15, zoom=3, inputs=['band13', 'temp_850']),
+    'image_22': node(plot_product, f'{output}/image_22.png', ' + GFS 1000-500 hPa Thickness (gpm)', 
+                     levels=np.arange(4900,5900,20), cmap='seismic', linestyle='dashed', inputs=['band13', 'thickness']),
+    'image_28': node(plot_product, f'{output}/image_28.png', ' + GFS PSML (hPa)', 
+                     levels=np.arange(900,1100,2), scale=0.01, inputs=['band13', 'prmsl']),
+}
+
+products = ['image_19', 'image_20', 'image_21', 'image_22', 'image_28']
+
+#-----------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    # Run the products (the intermediate arrays are kept on disk, in the "Pipeline" directory)
+    images = run_pipeline(nodes, products, cache_dir=f'{output}/Pipeline')
+    for product, image in images.items():
+        print(product, image)
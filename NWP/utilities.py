@@ -3,7 +3,6 @@
 # Required modules
 import os                                # Miscellaneous operating system interfaces
 import numpy as np                       # Import the Numpy package
-import colorsys                          # To make convertion of colormaps
 import boto3                             # Amazon Web Services (AWS) SDK for Python
 from botocore import UNSIGNED            # boto3 config
 from botocore.config import Config       # boto3 config
@@ -31,47 +30,48 @@ def loadCPT(path):
 
     f.close()
 
-    x = np.array([])
-    r = np.array([])
-    g = np.array([])
-    b = np.array([])
+    x = []
+    colors = []
+
+    # Background (B), foreground (F) and NaN (N) colors
+    special = {}
 
     colorModel = 'RGB'
 
     for l in lines:
         ls = l.split()
+        if len(ls) == 0:
+            continue
         if l[0] == '#':
             if ls[-1] == 'HSV':
                 colorModel = 'HSV'
-                continue
-            else:
-                continue
+            continue
         if ls[0] == 'B' or ls[0] == 'F' or ls[0] == 'N':
-            pass
+            try:
+                special[ls[0]] = [float(v) for v in ls[1:4]]
+            except ValueError:
+                pass
         else:
-            x=np.append(x,float(ls[0]))
-            r=np.append(r,float(ls[1]))
-            g=np.append(g,float(ls[2]))
-            b=np.append(b,float(ls[3]))
-            xtemp = float(ls[4])
-            rtemp = float(ls[5])
-            gtemp = float(ls[6])
-            btemp = float(ls[7])
-
-        x=np.append(x,xtemp)
-        r=np.append(r,rtemp)
-        g=np.append(g,gtemp)
-        b=np.append(b,btemp)
+            x.append(float(ls[0]))
+            colors.append([float(v) for v in ls[1:4]])
+            x.append(float(ls[4]))
+            colors.append([float(v) for v in ls[5:8]])
+
+    # Convert all the colors (stops and B / F / N) to RGB (0 - 1) at once
+    keys = [k for k in ['B', 'F', 'N'] if len(special.get(k, [])) == 3]
+    colors = np.array(colors + [special[k] for k in keys], dtype=float).reshape(-1, 3)
 
     if colorModel == 'HSV':
-        for i in range(r.shape[0]):
-            rr, gg, bb = colorsys.hsv_to_rgb(r[i]/360.,g[i],b[i])
-        r[i] = rr ; g[i] = gg ; b[i] = bb
+        colors = hsv2rgb(colors[:, 0]/360., colors[:, 1], colors[:, 2])
 
     if colorModel == 'RGB':
-        r = r/255.0
-        g = g/255.0
-        b = b/255.0
+        colors = colors/255.0
+
+    x = np.array(x)
+    r = colors[:len(x), 0]
+    g = colors[:len(x), 1]
+    b = colors[:len(x), 2]
+    special = dict(zip(keys, colors[len(x):].tolist()))
 
     xNorm = (x - x[0])/(x[-1] - x[0])
 
@@ -86,7 +86,131 @@ def loadCPT(path):
 
     colorDict = {'red': red, 'green': green, 'blue': blue}
 
+    # Under / over / bad colors from the B / F / N entries (ignored by LinearSegmentedColormap, see loadCPT_cmap)
+    for k, name in [('B', 'under'), ('F', 'over'), ('N', 'bad')]:
+        if k in special:
+            colorDict[name] = special[k]
+
     return colorDict
+
+# Vectorized HSV to RGB conversion (hue, saturation and value from 0 to 1), returns a (n, 3) array
+def hsv2rgb(h, s, v):
+    h = np.asarray(h, dtype=float)
+    s = np.asarray(s, dtype=float)
+    v = np.asarray(v, dtype=float)
+    i = np.floor(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(int) % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=1)
+
+# Load a CPT file as a matplotlib colormap (cached in memory, keyed by the CPT modification time). With 
+# 'special', the B / F / N entries are the under / over / bad colors; by default, the values out of the range
+# have the colors of the ends of the table and the NaNs are transparent
+CPT_CMAPS = {}
+
+def loadCPT_cmap(path, name='cpt', special=False):
+    from matplotlib.colors import LinearSegmentedColormap
+
+    key = (os.path.abspath(path), name, special, os.path.getmtime(path) if os.path.exists(path) else None)
+    if key in CPT_CMAPS:
+        return CPT_CMAPS[key]
+
+    cpt = loadCPT(path)
+    if cpt is None:
+        return None
+
+    cmap = LinearSegmentedColormap(name, cpt)
+    if special:
+        for color, set_color in [('under', cmap.set_under), ('over', cmap.set_over), ('bad', cmap.set_bad)]:
+            if color in cpt:
+                set_color(cpt[color])
+    CPT_CMAPS[key] = cmap
+    return cmap
+
+#-----------------------------------------------------------------------------------------------------------
+# Compile a CPT file into a lookup table (LUT): a (n + 3, 4) uint8 RGBA array with n colors, followed by
+# the under (n), over (n + 1) and bad / NaN (n + 2) colors: the ends of the table and transparent or, with
+# 'special', the B / F / N entries of the CPT. The LUT is cached in memory and on disk (cache_dir, by default
+# a 'LUT_cache' directory next to the CPT file), keyed by the CPT modification time
+CPT_LUTS = {}
+
+def compile_CPT(path, n=256, cache_dir=None, special=False):
+
+    mtime = os.path.getmtime(path)
+    key = (os.path.abspath(path), n, special, mtime)
+    if key in CPT_LUTS:
+        return CPT_LUTS[key]
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), 'LUT_cache')
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_file = f'{cache_dir}/{name}_{n}{"_special" if special else ""}_{int(mtime * 1e6)}.npy'
+
+    if os.path.exists(cache_file):
+        lut = np.load(cache_file)
+    else:
+        # Interpolate the CPT colors for n equally spaced values
+        cpt = loadCPT(path)
+        if cpt is None:
+            return None
+        xNorm = np.array([s[0] for s in cpt['red']])
+        values = (np.arange(n) + 0.5) / n
+        lut = np.zeros((n + 3, 4), dtype=np.uint8)
+        for i, color in enumerate(['red', 'green', 'blue']):
+            lut[:n, i] = np.rint(255 * np.interp(values, xNorm, [s[1] for s in cpt[color]]))
+        lut[:n, 3] = 255
+        # Under, over and bad colors (from the B / F / N entries of the CPT, when asked and available)
+        lut[n] = lut[0]
+        lut[n + 1] = lut[n - 1]
+        lut[n + 2] = (0, 0, 0, 0)
+        for name, row in [('under', n), ('over', n + 1), ('bad', n + 2)]:
+            if special and name in cpt:
+                lut[row, :3] = np.rint(255 * np.array(cpt[name]))
+                lut[row, 3] = 255
+
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_file, lut)
+
+    CPT_LUTS[key] = lut
+    return lut
+
+# Apply a LUT (see compile_CPT) to an array, returning a (lines, cols, 4) uint8 RGBA image.
+# Values are scaled between vmin and vmax into the LUT indices, so coloring is a single gather.
+def apply_LUT(data, lut, vmin, vmax):
+
+    n = lut.shape[0] - 3
+
+    scaled = np.ma.filled(np.ma.asarray(data, dtype=np.float32), np.nan) - np.float32(vmin)
+    np.multiply(scaled, np.float32(n / (vmax - vmin)), out=scaled)
+
+    bad = np.isnan(scaled)
+    under = scaled < 0
+    over = scaled > n
+    np.clip(scaled, 0, n - 1, out=scaled)
+    scaled[bad] = 0
+
+    index = scaled.astype(np.intp)
+    index[under] = n
+    index[over] = n + 1
+    index[bad] = n + 2
+
+    return lut[index]
+#-----------------------------------------------------------------------------------------------------------
+# S3 client for the AMAZON repositories (anonymous access). It is created only once per process and shared 
+# by the download functions (the client is thread safe)
+S3_CLIENTS = {}
+
+def get_s3_client():
+    if 's3' not in S3_CLIENTS:
+        S3_CLIENTS['s3'] = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+    return S3_CLIENTS['s3']
+
 #-----------------------------------------------------------------------------------------------------------
 def download_CMI(yyyymmddhhmn, band, path_dest):
 
@@ -103,7 +227,7 @@ def download_CMI(yyyymmddhhmn, band, path_dest):
   product_name = 'ABI-L2-CMIPF'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6C{int(band):02.0f}_G16_s{year}{day_of_year}{hour}{min}'
@@ -147,7 +271,7 @@ def download_PROD(yyyymmddhhmn, product_name, path_dest):
   bucket_name = 'noaa-goes16'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6_G16_s{year}{day_of_year}{hour}{min}'
@@ -192,7 +316,7 @@ def download_GLM(yyyymmddhhmnss, path_dest):
   bucket_name = 'noaa-goes16'
 
   # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  s3_client = get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   product_name = "GLM-L2-LCFA"
@@ -312,3 +436,706 @@ def reproject(file_name, ncfile, array, extent, undef):
     # Write the reprojected file on disk
     gdal.Warp(file_name, raw, **kwargs)
 
+
+#-----------------------------------------------------------------------------------------------------------
+# RGB recipes
+# Each component is a combination of bands ({band number: coefficient}) with its minimum, maximum and gamma.
+# 'invert': True reverses the component after the normalization (1 - value).
+# IR bands in °C and visible / near IR bands in reflectance factor (0 - 1)
+RGB_RECIPES = {
+    # http://rammb.cira.colostate.edu/training/visit/quick_guides/QuickGuide_GOESR_AirMassRGB_final.pdf
+    'airmass': {'R': {'bands': {8: 1, 10: -1}, 'min': -26.2, 'max': 0.6, 'gamma': 1.0},
+                'G': {'bands': {12: 1, 13: -1}, 'min': -43.2, 'max': 6.7, 'gamma': 1.0},
+                'B': {'bands': {8: 1}, 'min': -64.65, 'max': -29.25, 'gamma': 1.0, 'invert': True}},
+    # http://rammb.cira.colostate.edu/training/visit/quick_guides/Day_Cloud_Phase_Distinction.pdf
+    'day_cloud_phase': {'R': {'bands': {13: 1}, 'min': -53.5, 'max': 7.5, 'gamma': 1.0, 'invert': True},
+                        'G': {'bands': {2: 1}, 'min': 0.0, 'max': 0.78, 'gamma': 1.0},
+                        'B': {'bands': {5: 1}, 'min': 0.01, 'max': 0.59, 'gamma': 1.0}},
+}
+
+# Create an RGB from a recipe (name in RGB_RECIPES or a dictionary) and a dictionary with the band arrays
+# ({band number: array}). The components are computed in place (clip, normalize, gamma and invert) and 
+# written in a (lines, cols, 3) float32 array. A preallocated 'out' array may be given.
+# With dtype=np.uint8 the components are quantized (0 - 255, NaN as 0) directly into an interleaved uint8
+# array, 4x smaller than float32, that can be used as is by imshow.
+def make_RGB(recipe, bands, out=None, dtype=np.float32):
+
+    if isinstance(recipe, str):
+        recipe = RGB_RECIPES[recipe]
+
+    # Masked values are converted to NaN
+    bands = {band: np.ma.filled(data.astype(np.float32), np.nan) if np.ma.isMaskedArray(data) else data 
+             for band, data in bands.items()}
+
+    shape = next(iter(bands.values())).shape
+    if out is None:
+        out = np.empty(shape + (3,), dtype=dtype)
+    quantize = (out.dtype == np.uint8)
+    channel = np.empty(shape, dtype=np.float32)
+
+    for i, component in enumerate(['R', 'G', 'B']):
+        c = recipe[component]
+
+        # Band combination
+        for n, (band, coefficient) in enumerate(c['bands'].items()):
+            if n == 0:
+                np.multiply(bands[band], coefficient, out=channel, casting='unsafe')
+            elif coefficient == 1:
+                np.add(channel, bands[band], out=channel, casting='unsafe')
+            elif coefficient == -1:
+                np.subtract(channel, bands[band], out=channel, casting='unsafe')
+            else:
+                channel += coefficient * bands[band]
+
+        # Clip, normalize, gamma and invert
+        np.clip(channel, c['min'], c['max'], out=channel)
+        np.subtract(channel, c['min'], out=channel)
+        np.multiply(channel, 1.0 / (c['max'] - c['min']), out=channel)
+        if c.get('gamma', 1.0) != 1.0:
+            np.power(channel, 1.0 / c['gamma'], out=channel)
+        if c.get('invert', False):
+            np.subtract(1.0, channel, out=channel)
+
+        if quantize:
+            np.multiply(channel, 255.0, out=channel)
+            np.rint(channel, out=channel)
+            np.nan_to_num(channel, copy=False, nan=0.0)
+            out[..., i] = channel
+        else:
+            out[..., i] = channel
+
+    return out
+
+#-----------------------------------------------------------------------------------------------------------
+# Read the geometries of a shapefile for an extent [min lon, min lat, max lon, max lat]
+# The shapefile is read only once per process (and indexed with a STRtree). The geometries that intersect 
+# the extent are clipped (with a margin, so the cuts are out of the map), simplified with 'tolerance' 
+# (in degrees, by default half of the pixel size of an image 'pixels' wide: 3000 for a 10 inch figure saved
+# with 300 dpi) and saved in 'cache_dir' (by default a 'Shapefile_cache' directory next to the shapefile) as 
+# WKB, to be reloaded fast
+SHAPEFILES = {}
+
+def load_shapefile(path, extent=None, pixels=3000, tolerance=None, cache_dir=None, margin=1.0):
+    import pickle
+    import hashlib
+    import shapely
+    import cartopy.io.shapereader as shpreader
+
+    if tolerance is None:
+        tolerance = 0.5 * (extent[2] - extent[0]) / pixels if (extent is not None and pixels) else 0.0
+
+    mtime = os.path.getmtime(path)
+    key = (os.path.abspath(path), mtime, None if extent is None else tuple(extent), tolerance)
+    if key in SHAPEFILES:
+        return SHAPEFILES[key]
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), 'Shapefile_cache')
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_file = f'{cache_dir}/{name}_{hashlib.md5(str(key).encode()).hexdigest()}.wkb'
+
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            geometries = list(shapely.from_wkb(pickle.load(f)))
+    else:
+        # All the geometries of the shapefile and their spatial index
+        if (key[0], mtime) not in SHAPEFILES:
+            all_geometries = np.array(list(shpreader.Reader(path).geometries()), dtype=object)
+            SHAPEFILES[(key[0], mtime)] = (all_geometries, shapely.STRtree(all_geometries))
+        all_geometries, tree = SHAPEFILES[(key[0], mtime)]
+
+        if extent is None:
+            geometries = all_geometries
+        else:
+            region = shapely.box(extent[0] - margin, extent[1] - margin, extent[2] + margin, extent[3] + margin)
+            geometries = shapely.intersection(all_geometries[tree.query(region)], region)
+
+        if tolerance > 0:
+            geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        geometries = [g for g in geometries if not g.is_empty]
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'wb') as f:
+            pickle.dump(list(shapely.to_wkb(np.array(geometries, dtype=object))), f)
+
+    SHAPEFILES[key] = geometries
+    return geometries
+
+#-----------------------------------------------------------------------------------------------------------
+# Streaming animation writer: GIF, animated WebP or MP4 (by the extension of the file name). Each frame is 
+# written as soon as it is appended, so only one frame is kept in memory, no matter the number of frames
+
+# Open an animation. 'fps' is the number of frames per second and 'loop' the number of loops (0: forever).
+# GIF: 'palette' is an RGB palette (N <= 256, 3) used by all the frames (e.g. from the color table, see 
+# LUT_palette; by default, the palette of the first frame is reused by the others) and each frame has only
+# the rectangle that changed from the previous one. WebP: 'quality' of each frame. MP4: 'crf' of the H.264 
+# encoder (ffmpeg)
+def open_animation(file_name, fps=1, loop=0, palette=None, quality=90, crf=23):
+    writer = {'file_name': file_name, 'format': os.path.splitext(file_name)[1].lower()[1:], 'fps': fps, 
+              'loop': loop, 'palette': palette, 'quality': quality, 'crf': crf, 'size': None, 'frames': 0,
+              'previous': None}
+    if writer['format'] not in ('gif', 'webp', 'mp4'):
+        raise ValueError(f'Animation format not supported: {file_name}')
+    return writer
+
+# Append a frame (an image file name or an RGB / RGBA uint8 array) to the animation. Frames with a different
+# size are pasted on a white canvas with the size of the first frame
+def append_frame(writer, frame):
+    import io
+    import struct
+    from PIL import Image
+
+    image = Image.open(frame) if isinstance(frame, str) else Image.fromarray(frame)
+    image = image.convert('RGB')
+    if writer['size'] is None:
+        writer['size'] = image.size
+        _start_animation(writer, image)
+    elif image.size != writer['size']:
+        canvas = Image.new('RGB', writer['size'], (255, 255, 255))
+        canvas.paste(image, (0, 0))
+        image = canvas
+    duration = int(round(1000.0 / writer['fps']))
+
+    if writer['format'] == 'gif':
+        from PIL import GifImagePlugin
+
+        # Palette indices of the frame (a lookup in the color cube of the palette, no quantization)
+        rgb = np.asarray(image)
+        indices = writer['cube'][rgb[..., 0] >> 2, rgb[..., 1] >> 2, rgb[..., 2] >> 2]
+
+        # Only the rectangle with the pixels that changed is written, over the previous frame (disposal 1)
+        x0, y0, x1, y1 = 0, 0, indices.shape[1], indices.shape[0]
+        if writer['previous'] is not None:
+            changed = indices != writer['previous']
+            rows = np.flatnonzero(changed.any(axis=1))
+            cols = np.flatnonzero(changed.any(axis=0))
+            if len(rows) == 0:
+                rows = cols = np.array([0])
+            x0, y0, x1, y1 = cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+        writer['previous'] = indices
+
+        rectangle = Image.frombytes('P', (int(x1 - x0), int(y1 - y0)), np.ascontiguousarray(indices[y0:y1, x0:x1]).tobytes())
+        for data in GifImagePlugin.getdata(rectangle, (int(x0), int(y0)), duration=duration, disposal=1):
+            writer['fp'].write(data)
+
+    elif writer['format'] == 'webp':
+        # Encode the frame as a WebP image and copy its bitstream to an ANMF (animation frame) chunk
+        buffer = io.BytesIO()
+        image.save(buffer, format='WEBP', quality=writer['quality'])
+        data = buffer.getvalue()
+        bitstream = b''
+        pos = 12
+        while pos < len(data):
+            size = struct.unpack('<I', data[pos + 4:pos + 8])[0]
+            if data[pos:pos + 4] in (b'ALPH', b'VP8 ', b'VP8L'):
+                bitstream += data[pos:pos + 8 + size + (size & 1)]
+            pos += 8 + size + (size & 1)
+        w, h = image.size
+        header = (struct.pack('<I', 0)[:3] + struct.pack('<I', 0)[:3] + struct.pack('<I', w - 1)[:3] + 
+                  struct.pack('<I', h - 1)[:3] + struct.pack('<I', duration)[:3] + bytes([2]))
+        writer['fp'].write(b'ANMF' + struct.pack('<I', len(header) + len(bitstream)) + header + bitstream)
+
+    elif writer['format'] == 'mp4':
+        writer['process'].stdin.write(image.tobytes())
+
+    writer['frames'] += 1
+
+# Write the header of the animation (when the first frame, with the size of the animation, arrives)
+def _start_animation(writer, image):
+    import struct
+    import subprocess
+
+    w, h = image.size
+    if writer['format'] == 'gif':
+        # Global palette (of the first frame, when not given)
+        if writer['palette'] is None:
+            writer['palette'] = np.array(image.quantize(256).getpalette()[:768], dtype=np.uint8).reshape(-1, 3)
+        colors = np.asarray(writer['palette'], dtype=np.uint8)[:256, :3]
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        palette[:len(colors)] = colors
+
+        # Color cube (64 x 64 x 64) with the index of the nearest palette color of each RGB color
+        levels = np.arange(64, dtype=np.float32) * 4 + 2
+        grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), -1).reshape(-1, 3)
+        colors = colors.astype(np.float32)
+        cube = np.empty(len(grid), dtype=np.uint8)
+        for i in range(0, len(grid), 16384):
+            distance = (colors ** 2).sum(1)[None, :] - 2 * grid[i:i + 16384] @ colors.T
+            cube[i:i + 16384] = distance.argmin(1)
+        writer['cube'] = cube.reshape(64, 64, 64)
+
+        writer['fp'] = open(writer['file_name'], 'wb')
+        writer['fp'].write(b'GIF89a' + struct.pack('<HHBBB', w, h, 0xF7, 0, 0) + palette.tobytes())
+        writer['fp'].write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', writer['loop']) + b'\x00')
+
+    elif writer['format'] == 'webp':
+        # RIFF header (the size is written when closing), canvas (VP8X) and animation (ANIM) chunks
+        writer['fp'] = open(writer['file_name'], 'wb')
+        writer['fp'].write(b'RIFF' + struct.pack('<I', 0) + b'WEBP')
+        writer['fp'].write(b'VP8X' + struct.pack('<I', 10) + bytes([2, 0, 0, 0]) + struct.pack('<I', w - 1)[:3] + struct.pack('<I', h - 1)[:3])
+        writer['fp'].write(b'ANIM' + struct.pack('<I', 6) + bytes([255, 255, 255, 255]) + struct.pack('<H', writer['loop']))
+
+    elif writer['format'] == 'mp4':
+        # The frames are sent to ffmpeg through a pipe (H.264 needs an even width and height)
+        command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}', 
+                   '-r', str(writer['fps']), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', 
+                   '-pix_fmt', 'yuv420p', '-crf', str(writer['crf']), writer['file_name']]
+        writer['process'] = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+# RGB palette (N <= 'colors', 3) for a GIF animation from a lookup table of a color table (see compile_CPT): 
+# the colors of the table (sampled when there are too many) and the 'extra' colors (texts, map elements, ...)
+def LUT_palette(lut, colors=256, extra=((0, 0, 0), (255, 255, 255))):
+    extra = np.asarray(extra, dtype=np.uint8).reshape(-1, 3)
+    table = np.asarray(lut)[:, :3]
+    room = colors - len(extra)
+    if len(table) > room:
+        table = table[np.linspace(0, len(table) - 1, room).round().astype(int)]
+    palette = np.vstack([table, extra])
+    return palette[np.sort(np.unique(palette, axis=0, return_index=True)[1])]
+
+# Finish the animation
+def close_animation(writer):
+    import struct
+    if writer['size'] is None:
+        return
+    if writer['format'] == 'gif':
+        writer['fp'].write(b';')
+        writer['fp'].close()
+    elif writer['format'] == 'webp':
+        size = writer['fp'].tell() - 8
+        writer['fp'].seek(4)
+        writer['fp'].write(struct.pack('<I', size))
+        writer['fp'].close()
+    elif writer['format'] == 'mp4':
+        writer['process'].stdin.close()
+        writer['process'].wait()
+
+#-----------------------------------------------------------------------------------------------------------
+# Local job scheduler: runs processing jobs (download, decode, reproject, render, publish, ...) side by side, 
+# with priorities, a pool of threads for the I/O jobs and a pool of processes for the CPU jobs (the functions
+# and arguments of the CPU jobs must be picklable, and the scripts must run inside "if __name__ == '__main__':")
+
+# Open a scheduler with 'io_workers' threads and 'cpu_workers' processes (by default, the number of CPUs)
+def open_scheduler(io_workers=4, cpu_workers=None):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    cpu_workers = cpu_workers or os.cpu_count()
+    return {'pools': {'io': ThreadPoolExecutor(io_workers), 'cpu': ProcessPoolExecutor(cpu_workers)},
+            'slots': {'io': io_workers, 'cpu': cpu_workers}, 'running': {'io': 0, 'cpu': 0},
+            'ready': {'io': [], 'cpu': []}, 'jobs': {}, 'count': 0, 'lock': threading.RLock()}
+
+# Submit a job: function(*results of the jobs in 'depends', *args, **kwargs), of 'kind' 'io' or 'cpu'. The 
+# jobs with the lowest 'priority' run first (e.g. 0 for GLM and IR loops, 10 for a daily SST map). 'depends'
+# is a list of futures or keys of other jobs that must finish before. A job with the same 'key' of a job 
+# already submitted (e.g. ('decode', file_name)) is not run again: the future of the first job is returned, 
+# so two products that need the same input share it. The jobs without a key are forgotten when they finish
+def submit_job(scheduler, key, function, *args, kind='cpu', priority=0, depends=(), **kwargs):
+    import heapq
+    from concurrent.futures import Future
+
+    with scheduler['lock']:
+        if key is not None and key in scheduler['jobs']:
+            return scheduler['jobs'][key]['future']
+
+        scheduler['count'] += 1
+        depends = [d if isinstance(d, Future) else scheduler['jobs'][d]['future'] for d in depends]
+        job = {'function': function, 'args': args, 'kwargs': kwargs, 'kind': kind, 'priority': priority, 
+               'order': scheduler['count'], 'depends': depends, 'remaining': len(depends), 'future': Future(),
+               'key': key if key is not None else ('job', scheduler['count']), 'shared': key is not None}
+        scheduler['jobs'][job['key']] = job
+
+        def dependency_done(future):
+            with scheduler['lock']:
+                job['remaining'] -= 1
+                if job['remaining'] == 0:
+                    heapq.heappush(scheduler['ready'][kind], (priority, job['order'], id(job), job))
+                    _dispatch_jobs(scheduler)
+
+        if not depends:
+            heapq.heappush(scheduler['ready'][kind], (priority, job['order'], id(job), job))
+        for future in depends:
+            future.add_done_callback(dependency_done)
+        _dispatch_jobs(scheduler)
+    return job['future']
+
+# Start the ready jobs with the highest priority while there are free workers
+def _dispatch_jobs(scheduler):
+    import heapq
+
+    with scheduler['lock']:
+        for kind in ('io', 'cpu'):
+            ready = scheduler['ready'][kind]
+            while ready and scheduler['running'][kind] < scheduler['slots'][kind]:
+                job = heapq.heappop(ready)[3]
+
+                # A job whose dependency failed fails with the same error
+                failed = [d.exception() for d in job['depends'] if d.exception() is not None]
+                if failed:
+                    job['future'].set_exception(failed[0])
+                    if not job['shared']:
+                        scheduler['jobs'].pop(job['key'], None)
+                    continue
+
+                scheduler['running'][kind] += 1
+                args = [d.result() for d in job['depends']] + list(job['args'])
+                job['depends'] = []
+                execution = scheduler['pools'][kind].submit(job['function'], *args, **job['kwargs'])
+                execution.add_done_callback(lambda execution, job=job: _job_done(scheduler, job, execution))
+
+# Copy the result (or the error) of a job to its future, forget it (without a key) and start the next jobs
+def _job_done(scheduler, job, execution):
+    with scheduler['lock']:
+        scheduler['running'][job['kind']] -= 1
+    if execution.exception() is not None:
+        job['future'].set_exception(execution.exception())
+    else:
+        job['future'].set_result(execution.result())
+    with scheduler['lock']:
+        if not job['shared']:
+            scheduler['jobs'].pop(job['key'], None)
+    _dispatch_jobs(scheduler)
+
+# Wait for all the jobs and close the pools
+def close_scheduler(scheduler):
+    from concurrent.futures import wait
+
+    while True:
+        with scheduler['lock']:
+            futures = [job['future'] for job in scheduler['jobs'].values() if not job['future'].done()]
+        if not futures:
+            break
+        wait(futures)
+    for pool in scheduler['pools'].values():
+        pool.shutdown()
+
+#-----------------------------------------------------------------------------------------------------------
+# Forecast sequence: run function(hour, *args, **kwargs) for each forecast hour (e.g. range(0, 121, 3)) in a
+# pool of 'workers' processes (by default, the number of CPUs) and return the results (frames, statistics, 
+# ...) in the forecast order. The function must be defined at the top level of the script and the script 
+# must run inside "if __name__ == '__main__':"
+def run_forecast_sequence(function, hours, *args, workers=None, **kwargs):
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    hours = list(hours)
+    if workers == 1 or len(hours) <= 1:
+        return [function(hour, *args, **kwargs) for hour in hours]
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(hours))) as executor:
+        return list(executor.map(partial(_forecast_hour, function, args, kwargs), hours))
+
+# Run the function of one forecast hour (in a process of the pool)
+def _forecast_hour(function, args, kwargs, hour):
+    return function(hour, *args, **kwargs)
+
+#-----------------------------------------------------------------------------------------------------------
+# Product pipeline (DAG): the products declare their inputs (band, product, GRIB field, extent) as nodes, and
+# the nodes shared by many products (e.g. the band 13 of script 19 to 27, or the GFS 500 hPa height) are 
+# computed only once. A node is a function whose first arguments are the results of its input nodes
+
+# Declare a node: function(*results of the 'inputs' nodes, *args, **kwargs), of 'kind' 'io' or 'cpu'
+def node(function, *args, inputs=(), kind='cpu', priority=0, **kwargs):
+    return {'function': function, 'args': args, 'kwargs': kwargs, 'inputs': list(inputs), 'kind': kind, 'priority': priority}
+
+# Run the nodes needed by the 'products' (names in the 'nodes' dict) and return {product: result}. The nodes 
+# run in a scheduler (see open_scheduler, by default a new one). The intermediate results are kept in memory 
+# or, with 'cache_dir', on disk (the arrays are memory-mapped by the nodes that use them), and are released 
+# as soon as all the nodes that use them (in all the pipelines running in the same scheduler) have finished
+def run_pipeline(nodes, products, scheduler=None, cache_dir=None):
+    import threading
+
+    # Nodes needed by the products (inputs first) and the number of nodes that use each one
+    order, consumers = [], {}
+    def visit(name):
+        if name not in consumers:
+            consumers[name] = 0
+            for input in nodes[name]['inputs']:
+                visit(input)
+            order.append(name)
+    for name in products:
+        visit(name)
+    for name in order:
+        for input in nodes[name]['inputs']:
+            consumers[input] += 1
+
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = open_scheduler()
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    futures, keys = {}, {}
+    lock = threading.Lock()
+
+    # Nodes shared with the other pipelines running in the same scheduler: number of pipelines using each node
+    with scheduler['lock']:
+        users = scheduler.setdefault('pipeline_users', {})
+
+    # Forget the result of a node (and its files) when the last consumer of the last pipeline using it finishes
+    def forget(name, future):
+        with scheduler['lock']:
+            users[keys[name]] -= 1
+            if users[keys[name]] > 0:
+                return
+            del users[keys[name]]
+            scheduler['jobs'].pop(keys[name], None)
+            if future.done() and not future.exception() and isinstance(future.result(), dict) and 'pipeline_cache' in future.result():
+                for file in future.result()['pipeline_cache']:
+                    os.remove(file)
+
+    # Release a node of this pipeline when its last consumer finishes
+    def release(name):
+        with lock:
+            consumers[name] -= 1
+            if consumers[name] > 0 or name in products:
+                return
+            future = futures.pop(name)
+        forget(name, future)
+
+    for name in order:
+        n = nodes[name]
+        cache_file = f'{cache_dir}/{name}' if cache_dir and name not in products else None
+
+        # Scheduler key: the node is shared only with a node of the same function, arguments and inputs
+        keys[name] = _node_key(name, n, [keys[input] for input in n['inputs']], cache_file)
+        with scheduler['lock']:
+            users[keys[name]] = users.get(keys[name], 0) + 1
+            future = submit_job(scheduler, keys[name], _run_node, depends=[futures[input] for input in n['inputs']],
+                                kind=n['kind'], priority=n['priority'], node_function=n['function'], 
+                                node_args=n['args'], node_kwargs=n['kwargs'], cache_file=cache_file)
+        future.add_done_callback(lambda future, inputs=n['inputs']: [release(input) for input in inputs])
+        futures[name] = future
+
+    try:
+        return {name: futures[name].result() for name in products}
+    finally:
+        for name in products:
+            forget(name, futures[name])
+        if own_scheduler:
+            close_scheduler(scheduler)
+
+# Scheduler key of a node: its name, function, arguments, inputs (their keys) and cache file (the arguments,
+# often lists or arrays, are not hashable, so they are in the key as a digest of their full repr)
+def _node_key(name, n, inputs, cache_file):
+    import sys
+    import hashlib
+
+    with np.printoptions(threshold=sys.maxsize):
+        signature = repr((n['args'], sorted(n['kwargs'].items()), inputs, cache_file))
+    return ('node', name, n['function'], hashlib.sha1(signature.encode()).hexdigest())
+
+# Run a node (in a thread or in a process of the scheduler) and, with a 'cache_file', save its result on disk:
+# the arrays (the result or the items of a tuple, e.g. (values, lats, lons, info)) in .npy files, to be 
+# memory-mapped, and the rest in a .pkl file. Returns {'pipeline_cache': files, with the .pkl file last}
+def _run_node(*inputs, node_function, node_args, node_kwargs, cache_file):
+    import pickle
+
+    inputs = [_load_node(input) for input in inputs]
+    result = node_function(*inputs, *node_args, **node_kwargs)
+    if cache_file is None:
+        return result
+
+    items = list(result) if isinstance(result, tuple) else [result]
+    arrays = {}
+    for i, item in enumerate(items):
+        if isinstance(item, np.ndarray) and not item.dtype.hasobject and not np.ma.isMaskedArray(item):
+            arrays[i] = f'{cache_file}.{i}.npy'
+            np.save(arrays[i], item)
+            items[i] = None
+    with open(cache_file + '.pkl', 'wb') as f:
+        pickle.dump((isinstance(result, tuple), items, arrays), f, pickle.HIGHEST_PROTOCOL)
+    return {'pipeline_cache': list(arrays.values()) + [cache_file + '.pkl']}
+
+# Read the result of a node saved on disk
+def _load_node(result):
+    import pickle
+
+    if not isinstance(result, dict) or 'pipeline_cache' not in result:
+        return result
+    with open(result['pipeline_cache'][-1], 'rb') as f:
+        is_tuple, items, arrays = pickle.load(f)
+    for i, file in arrays.items():
+        items[i] = np.load(file, mmap_mode='r')
+    return tuple(items) if is_tuple else items[0]
+
+#-----------------------------------------------------------------------------------------------------------
+# GRIB index: the keys, position and size of each message of a GRIB file are read once (and saved in a 
+# "<file>.index.json" sidecar), so each selection reads only the selected messages, instead of scanning all
+# the messages of the file (about 700 in the GFS 0.5°) as pygrib select does
+GRIB_KEYS = ('shortName', 'name', 'typeOfLevel', 'level', 'forecastTime')
+GRIB_INDEXES = {}
+
+# Return the index of a GRIB file: {'path': path, 'messages': [{key: value, 'offset': ..., 'length': ...}]}
+def index_GRIB(path, sidecar=None):
+    import json
+    import threading
+    import pygrib
+
+    sidecar = sidecar or path + '.index.json'
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if key in GRIB_INDEXES:
+        return GRIB_INDEXES[key]
+
+    # Read the sidecar, if it was made for this version of the file (a damaged sidecar is made again)
+    messages = None
+    if os.path.exists(sidecar):
+        try:
+            with open(sidecar) as f:
+                index = json.load(f)
+            if index['size'] == stat.st_size and index['mtime'] == stat.st_mtime:
+                messages = index['messages']
+        except (ValueError, KeyError, TypeError, OSError):
+            messages = None
+
+    # Scan the file: each message starts with "GRIB" and has its total length in the header
+    if messages is None:
+        messages = []
+        with open(path, 'rb') as f:
+            offset = 0
+            while True:
+                f.seek(offset)
+                header = f.read(16)
+                if len(header) < 16:
+                    break
+                if not header.startswith(b'GRIB'):
+                    # Skip any padding between the messages
+                    start = (header + f.read(1024 * 1024)).find(b'GRIB')
+                    if start < 0:
+                        break
+                    offset += start
+                    continue
+                if header[7] == 2:
+                    length = int.from_bytes(header[8:16], 'big')
+                else:
+                    length = int.from_bytes(header[4:7], 'big')
+                f.seek(offset)
+                grb = pygrib.fromstring(f.read(length))
+                message = {k: grb[k] if grb.has_key(k) else None for k in GRIB_KEYS}
+                message.update({'offset': offset, 'length': length})
+                messages.append(message)
+                offset += length
+        # Each process (and thread) writes its own temporary file, so two indexers never mix their writes
+        temp = f'{sidecar}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp, 'w') as f:
+                json.dump({'size': stat.st_size, 'mtime': stat.st_mtime, 'messages': messages}, f)
+            os.replace(temp, sidecar)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    GRIB_INDEXES[key] = {'path': path, 'messages': messages}
+    return GRIB_INDEXES[key]
+
+# Select messages as pygrib select (e.g. name='Temperature', typeOfLevel='isobaricInhPa', level=850), reading
+# only the selected messages of the file. Values may be lists (e.g. level=[850, 500])
+def select_GRIB(index, **keys):
+    import pygrib
+
+    if isinstance(index, str):
+        index = index_GRIB(index)
+    selected = [m for m in index['messages'] if all(m[k] in v if isinstance(v, (list, tuple)) else m[k] == v 
+                                                  for k, v in keys.items())]
+    if not selected:
+        raise ValueError('no matches found')
+    messages = []
+    with open(index['path'], 'rb') as f:
+        for m in selected:
+            f.seek(m['offset'])
+            messages.append(pygrib.fromstring(f.read(m['length'])))
+    return messages
+
+# Cut a GRIB message to the 'extent' and return (values, lats, lons), as message.data(lat1=..., lat2=..., 
+# lon1=..., lon2=...). The rows / columns of the extent and the lats / lons are computed once for each grid
+# and extent (and shared by all the messages on the same grid); the values are a view of the decoded field
+GRIB_SUBSETS = {}
+
+def subset_GRIB(message, extent):
+    grid = tuple(message[k] for k in ('gridType', 'Ni', 'Nj', 'latitudeOfFirstGridPointInDegrees', 
+                                      'longitudeOfFirstGridPointInDegrees', 'latitudeOfLastGridPointInDegrees',
+                                      'longitudeOfLastGridPointInDegrees')) + tuple(extent)
+    if grid not in GRIB_SUBSETS:
+        lats, lons = message.latlons()
+        lon1, lon2 = extent[0] % 360, extent[2] % 360
+        inside = (lons >= lon1) & (lons <= lon2) if lon1 <= lon2 else (lons >= lon1) | (lons <= lon2)
+        mask = (lats >= extent[1]) & (lats <= extent[3]) & inside
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        rows = slice(rows[0], rows[-1] + 1)
+        # A continuous range of columns is a slice (a view); an extent across the end of the grid is not (the
+        # columns are sorted from west to east)
+        if cols[-1] - cols[0] + 1 == len(cols):
+            cols = slice(cols[0], cols[-1] + 1)
+        else:
+            east = lons[rows.start, cols] < lon1
+            cols = np.concatenate([cols[~east], cols[east]])
+        lats, lons = lats[rows, cols].copy(), lons[rows, cols].copy()
+        lats.flags.writeable = False
+        lons.flags.writeable = False
+        GRIB_SUBSETS[grid] = (rows, cols, lats, lons)
+
+    rows, cols, lats, lons = GRIB_SUBSETS[grid]
+    return message.values[rows, cols], lats, lons
+
+# Read a variable ('names' as a string) or many variables ('names' as a list) in a list of 'levels' and in the
+# 'extent' and return (cube, lats, lons), where the cube is a float32 array of shape (level, lat, lon), or 
+# (variable, level, lat, lon) for a list of variables. The lats / lons of the extent are computed only once
+# (see subset_GRIB)
+def GRIB_cube(index, names, levels, extent, typeOfLevel='isobaricInhPa'):
+    variables = [names] if isinstance(names, str) else list(names)
+    messages = select_GRIB(index, name=variables, typeOfLevel=typeOfLevel, level=list(levels))
+    fields = {}
+    for message in messages:
+        fields.setdefault((message['name'], message['level']), message)
+
+    cube = None
+    for v, name in enumerate(variables):
+        for l, level in enumerate(levels):
+            if (name, level) not in fields:
+                raise ValueError(f'{name} in {level} {typeOfLevel} not found')
+            values, lats, lons = subset_GRIB(fields[(name, level)], extent)
+            if cube is None:
+                cube = np.empty((len(variables), len(levels)) + lats.shape, dtype=np.float32)
+            cube[v, l] = np.ma.filled(values, np.nan)
+
+    return (cube[0] if isinstance(names, str) else cube), lats, lons
+
+#-----------------------------------------------------------------------------------------------------------
+# Pipeline nodes shared by the satellite + NWP products
+
+# Read the CMI of a GOES-R file, reproject it to the 'extent' (the file is saved in 'path_output') and return 
+# (data, time_coverage_start), with the brightness temperatures in °C ('celsius')
+def reproject_CMI(file_name, path_dest, path_output, extent, celsius=True):
+    from netCDF4 import Dataset
+
+    var = 'CMI'
+    img = gdal.Open(f'NETCDF:{path_dest}/{file_name}.nc:' + var)
+
+    # Read the header metadata
+    metadata = img.GetMetadata()
+    scale = float(metadata.get(var + '#scale_factor'))
+    offset = float(metadata.get(var + '#add_offset'))
+    undef = float(metadata.get(var + '#_FillValue'))
+    dtime = metadata.get('NC_GLOBAL#time_coverage_start')
+
+    # Load the data, apply the scale, offset and convert to celsius
+    ds_cmi = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
+    ds_cmi = (ds_cmi * scale + offset) - (273.15 if celsius else 0)
+
+    # Reproject the file and read the pixel values
+    filename_ret = f'{path_output}/{file_name}_ret.nc'
+    reproject(filename_ret, img, ds_cmi, extent, undef)
+    with Dataset(filename_ret) as file:
+        data = np.ma.filled(file.variables['Band1'][:].astype(np.float32), np.nan)
+    return data, dtime
+
+# Read a GRIB field in the 'extent' and return (values, lats, lons, info), where info has the 'init', 'run', 
+# 'ftime' and 'valid' of the field. 'index' is the index of the GRIB file (see index_GRIB) or its path, and 
+# 'select' are the keys of pygrib select (name, typeOfLevel, level, ...)
+def GRIB_field(index, extent, **select):
+    field = select_GRIB(index, **select)[0]
+    info = {'init': str(field.analDate), 'run': str(field.hour).zfill(2), 
+            'ftime': str(field.forecastTime), 'valid': str(field.validDate)}
+    values, lats, lons = subset_GRIB(field, extent)
+    return np.ma.filled(values, np.nan), lats, lons, info